@@ -0,0 +1,104 @@
+#!/usr/bin/env python2.7
+# Compare polling pipelines through full ORM objects against the Core reads of DBHelper
+# (get_idle_pipelines and get_pipeline_rows). Runs against an in-memory SQLite database so no MySQL server is needed.
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from CCDaemon.Database import DBHelper
+from CCDaemon.Database.DatabaseModel import Analysis, AnalysisType, AnalysisStatus
+from CCDaemon.Pipeline import PipelineStatus
+
+def configure_argparser(argparser_obj):
+    argparser_obj.add_argument("--idle",        action="store", type=int, dest="num_idle",      default=10000,
+                               help="Number of IDLE pipelines in the database.")
+    argparser_obj.add_argument("--running",     action="store", type=int, dest="num_running",   default=500,
+                               help="Number of running pipelines checked by every poll.")
+    argparser_obj.add_argument("--polls",       action="store", type=int, dest="num_polls",     default=20,
+                               help="Number of polling rounds.")
+
+def fill_row(table, **values):
+    # Give every required column without a default a dummy value of its type
+    row = {}
+    for column in table.columns:
+        if column.name in values:
+            row[column.name] = values[column.name]
+        elif column.primary_key or column.nullable or column.default is not None or column.server_default is not None:
+            continue
+        else:
+            python_type = column.type.python_type
+            if python_type in (datetime.datetime, datetime.date):
+                row[column.name] = datetime.datetime.now()
+            elif python_type is bool:
+                row[column.name] = False
+            else:
+                row[column.name] = python_type(1) if python_type in (int, long, float) else python_type("x")
+    return row
+
+def new_database(num_idle, num_running):
+    # SQLite with a single shared connection so every session sees the same in-memory database
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    AnalysisStatus.__table__.create(engine)
+    AnalysisType.__table__.create(engine)
+    Analysis.__table__.create(engine)
+
+    # Only the statuses of the synthetic pipelines are needed
+    db_helper = DBHelper.from_engine(engine, sync=False, monitor_tag="Benchmark")
+    db_helper.sync_statuses([PipelineStatus.IDLE, PipelineStatus.RUNNING])
+
+    with engine.begin() as connection:
+        connection.execute(AnalysisType.__table__.insert(),
+                           fill_row(AnalysisType.__table__, analysis_type_id=1, cpus=8, max_run_time=3600))
+        rows = []
+        for analysis_id in range(1, num_idle + num_running + 1):
+            status = PipelineStatus.IDLE if analysis_id <= num_idle else PipelineStatus.RUNNING
+            rows.append(fill_row(Analysis.__table__, analysis_id=analysis_id, analysis_type_id=1,
+                                 status_id=db_helper.statuses[status]))
+        connection.execute(Analysis.__table__.insert(), rows)
+
+    return db_helper
+
+def poll_orm(db_helper, session, running_ids):
+    # Polling used before Core reads: ORM objects for idle pipelines and one get_pipeline per running pipeline
+    cpus = [pipeline.analysis_type.cpus for pipeline in db_helper.get_pipeline(session, status=PipelineStatus.IDLE)]
+    for pipeline_id in running_ids:
+        pipeline = db_helper.get_pipeline(session, pipeline_id=pipeline_id)
+        cpus.append(pipeline.analysis_type.max_run_time)
+    return len(cpus)
+
+def poll_core(db_helper, session, running_ids):
+    rows = db_helper.get_idle_pipelines(session) + db_helper.get_pipeline_rows(session, running_ids)
+    return len(rows)
+
+def time_polls(poll, db_helper, session_factory, running_ids, num_polls):
+    start       = time.time()
+    num_rows    = 0
+    for i in range(num_polls):
+        session     = session_factory()
+        num_rows    = poll(db_helper, session, running_ids)
+        session.close()
+    return time.time() - start, num_rows
+
+def main():
+    argparser = argparse.ArgumentParser(prog="BenchmarkPollingReads")
+    configure_argparser(argparser)
+    args = argparser.parse_args()
+
+    db_helper       = new_database(args.num_idle, args.num_running)
+    session_factory = db_helper.session_factory
+    running_ids     = range(args.num_idle + 1, args.num_idle + args.num_running + 1)
+    print "Polling %d idle and %d running pipelines %d times..." % (args.num_idle, args.num_running, args.num_polls)
+
+    for name, poll in [("ORM", poll_orm), ("Core", poll_core)]:
+        elapsed, num_rows = time_polls(poll, db_helper, session_factory, running_ids, args.num_polls)
+        print "%-6s %8.3fs  %6.2fms/poll  %d rows/poll" % (name, elapsed, 1000.0 * elapsed / args.num_polls, num_rows)
+
+if __name__ == "__main__":
+    main()
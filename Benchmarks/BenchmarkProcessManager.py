@@ -0,0 +1,77 @@
+#!/usr/bin/env python2.7
+# Compare waiting on many synthetic 'sleep' commands with one thread per process blocked in communicate()
+# against watching them all from the shared ProcessManager poll loop
+import argparse
+import os
+import subprocess as sp
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CCDaemon.Platform.Process import Process
+from CCDaemon.Platform.ProcessManager import ProcessManager
+
+def configure_argparser(argparser_obj):
+    argparser_obj.add_argument("--processes",   action="store", type=int,   dest="num_processes",   default=200,
+                               help="Number of processes run at the same time.")
+    argparser_obj.add_argument("--sleep",       action="store", type=float, dest="sleep_time",      default=1.0,
+                               help="Seconds each process sleeps for.")
+    argparser_obj.add_argument("--output",      action="store", type=int,   dest="output_size",     default=65536,
+                               help="Bytes each process writes to stdout after sleeping.")
+
+def start_process(sleep_time, output_size):
+    cmd = "sleep %s ; head -c %d /dev/zero ; echo done >&2" % (sleep_time, output_size)
+    return Process(cmd, shell=True, stdout=sp.PIPE, stderr=sp.PIPE, preexec_fn=os.setsid, close_fds=True)
+
+def run_with_threads(num_processes, sleep_time, output_size):
+    # Waiting used before the process manager: one thread per process blocked until it exits
+    results = [None] * num_processes
+
+    def wait(i, process):
+        results[i] = process.communicate()
+
+    threads         = []
+    peak_threads    = 0
+    for i in range(num_processes):
+        thread = threading.Thread(target=wait, args=(i, start_process(sleep_time, output_size)))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+        peak_threads = max(peak_threads, threading.active_count())
+
+    for thread in threads:
+        thread.join()
+    return results, peak_threads
+
+def run_with_manager(num_processes, sleep_time, output_size):
+    manager         = ProcessManager.get_shared()
+    processes       = []
+    peak_threads    = 0
+    for i in range(num_processes):
+        process = start_process(sleep_time, output_size)
+        process.set_future(manager.watch(process))
+        processes.append(process)
+        peak_threads = max(peak_threads, threading.active_count())
+
+    results = [process.get_output() for process in processes]
+    return results, peak_threads
+
+def main():
+    argparser = argparse.ArgumentParser(prog="BenchmarkProcessManager")
+    configure_argparser(argparser)
+    args = argparser.parse_args()
+
+    print "Running %d processes sleeping %.1fs and writing %d bytes each..." % \
+          (args.num_processes, args.sleep_time, args.output_size)
+
+    for name, run in [("threads", run_with_threads), ("manager", run_with_manager)]:
+        start                   = time.time()
+        results, peak_threads   = run(args.num_processes, args.sleep_time, args.output_size)
+        elapsed                 = time.time() - start
+        num_complete            = len([out for out, err in results if len(out) == args.output_size and err == "done\n"])
+        print "%-8s %8.3fs  %4d peak threads  %d/%d complete" % (name, elapsed, peak_threads, num_complete, args.num_processes)
+
+if __name__ == "__main__":
+    main()
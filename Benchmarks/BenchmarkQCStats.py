@@ -0,0 +1,86 @@
+#!/usr/bin/env python2.7
+# Compare registering QC stats one ORM object at a time against DBHelper.register_qc_stats
+# Runs against an in-memory SQLite database so no MySQL server is needed
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from CCDaemon.Database import DBHelper
+from CCDaemon.Database.DatabaseModel import Stats
+from CCDaemon.Workers.ReportWorker import QCStat
+
+# Only the id of a pipeline is needed to register its stats
+FakePipeline = namedtuple("FakePipeline", ["analysis_id"])
+
+def configure_argparser(argparser_obj):
+    argparser_obj.add_argument("--samples",     action="store", type=int, dest="num_samples",   default=20,
+                               help="Number of samples in the QC report.")
+    argparser_obj.add_argument("--stats",       action="store", type=int, dest="num_stats",     default=500,
+                               help="Number of stats per sample.")
+    argparser_obj.add_argument("--duplicates",  action="store", type=int, dest="num_copies",    default=2,
+                               help="Number of qc_report files each stat appears in.")
+
+def make_qc_stats(num_samples, num_stats, num_copies):
+    qc_stats = []
+    for copy in range(num_copies):
+        for sample in range(num_samples):
+            for stat in range(num_stats):
+                qc_stats.append(QCStat("sample_%d" % sample, {"Name":   "stat_%d" % stat,
+                                                              "Value":  str(stat),
+                                                              "Module": "task_%d" % (stat % 10),
+                                                              "Source": "input_%d.bam" % sample,
+                                                              "Note":   ""}))
+    return qc_stats
+
+def new_session():
+    engine = create_engine("sqlite://")
+    Stats.__table__.create(engine)
+    return sessionmaker(bind=engine)()
+
+def register_one_by_one(session, pipeline, qc_stats):
+    # Registration used before bulk inserts: list based dedupe and one ORM object per stat
+    qc_entries_seen = []
+    for qc_stat in qc_stats:
+        stat_id = "{0}_{1}_{2}_{3}".format(qc_stat.get_sample_id(), qc_stat.get_key(),
+                                           qc_stat.get_task_id(), qc_stat.get_input_file())
+        if stat_id not in qc_entries_seen:
+            session.add(Stats(analysis_id=pipeline.analysis_id,
+                              sample_id=qc_stat.get_sample_id(),
+                              key=qc_stat.get_key(),
+                              value=qc_stat.get_value(),
+                              input_file=qc_stat.get_input_file(),
+                              task_id=qc_stat.get_task_id(),
+                              notes=qc_stat.get_notes()))
+            qc_entries_seen.append(stat_id)
+
+def time_registration(register, qc_stats):
+    session     = new_session()
+    start       = time.time()
+    register(session, FakePipeline(analysis_id=1), qc_stats)
+    session.commit()
+    elapsed     = time.time() - start
+    num_rows    = session.query(Stats).count()
+    session.close()
+    return elapsed, num_rows
+
+def main():
+    argparser = argparse.ArgumentParser(prog="BenchmarkQCStats")
+    configure_argparser(argparser)
+    args = argparser.parse_args()
+
+    qc_stats = make_qc_stats(args.num_samples, args.num_stats, args.num_copies)
+    print "Registering %d QC stats (%d unique)..." % (len(qc_stats), args.num_samples * args.num_stats)
+
+    for name, register in [("one by one", register_one_by_one), ("bulk", DBHelper.register_qc_stats)]:
+        elapsed, num_rows = time_registration(register, qc_stats)
+        print "%-12s %8.3fs  %d rows" % (name, elapsed, num_rows)
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,10 @@ import sys
 import os
 
 from Config import ConfigParser
-from CCDaemon.Workers import LaunchWorker, RunWorker, ReportWorker
+from CCDaemon.Workers import LaunchWorker, RunWorker, ReportWorker, ArchiveWorker, CancelWorker
 from CCDaemon.Pipeline import PipelineStatus, PipelineError
 from CCDaemon.Database import DBHelper
+from CCDaemon.Platform import RetryPolicy
 from PipelineQueue import PipelineQueue
 from PlatformFactory import PlatformFactory
 from Emailer import Emailer
@@ -45,11 +46,19 @@ class DaemonManager:
         self.email_recipients   = self.config.pop("email_recipients")
         self.daemon_sleep_time  = self.config.get("daemon_sleep_time",   60)
         self.worker_sleep_time  = self.config.get("worker_sleep_time",   5)
+        self.archive_sleep_time = self.config.get("archive_sleep_time",  3600)
+        self.cancel_sleep_time  = self.config.get("cancel_sleep_time",   1)
 
         # Create worker threads
         self.launch_worker  = LaunchWorker(self.db_helper, self.pipeline_queue, self.platform_factory, self.worker_sleep_time)
         self.run_worker     = RunWorker(self.db_helper, self.pipeline_queue, self.worker_sleep_time)
         self.report_worker  = ReportWorker(self.db_helper, self.pipeline_queue, self.report_queue, self.platform_factory.get_platform("ReportPlatform"))
+        self.cancel_worker  = CancelWorker(self.db_helper, self.pipeline_queue, self.cancel_sleep_time)
+
+        # Create archive worker thread if archiving of finished pipelines is enabled
+        self.archive_worker = None
+        if self.db_helper.archiver.is_enabled():
+            self.archive_worker = ArchiveWorker(self.db_helper, self.pipeline_queue, self.archive_sleep_time)
 
         # Stop thread
         self.stopped = False
@@ -84,10 +93,20 @@ class DaemonManager:
         # Update potentially outdated pipeline statuses in DB
         self.__update_outdated_runs()
 
+        # Create cancellation signal table before cancel worker starts polling it
+        self.db_helper.migrate_cancel_signals()
+
+        # Create archive tables and indexes before archive worker starts using them
+        if self.archive_worker is not None:
+            self.db_helper.migrate_archive()
+
         self.summoned = True
         self.launch_worker.start()
         self.run_worker.start()
         self.report_worker.start()
+        self.cancel_worker.start()
+        if self.archive_worker is not None:
+            self.archive_worker.start()
         logging.info(
             "CC-Daemon is afoot. Tread lightly brave warrior. There are fouler things than orcs in these mines...")
 
@@ -96,10 +115,25 @@ class DaemonManager:
             # Print status of current pipeline queue
             logging.info("\n\n%s\n\n" % self.pipeline_queue)
 
+            # Print database usage by each worker and config cache usage
+            logging.info("(CCDaemon) %s" % self.db_helper.monitor)
+            logging.info("(CCDaemon) %s" % self.db_helper.config_cache)
+
+            # Print usage of warm processor pools
+            for processor_pool in self.platform_factory.get_processor_pools():
+                logging.info("(CCDaemon) %s" % processor_pool)
+
+            # Print retry counters of each class of error
+            for retry_policy in RetryPolicy.get_policies():
+                logging.info("(CCDaemon) %s" % retry_policy)
+
             # Raise any errors thrown by any worker thread
             self.launch_worker.check()
             self.run_worker.check()
             self.report_worker.check()
+            self.cancel_worker.check()
+            if self.archive_worker is not None:
+                self.archive_worker.check()
 
             # Sleep for a lil bit
             time.sleep(self.daemon_sleep_time)
@@ -132,6 +166,8 @@ class DaemonManager:
         # Stop any new pipelines from launching
         logging.info("Stopping new jobs from launching...")
         self.launch_worker.stop()
+        if self.archive_worker is not None:
+            self.archive_worker.stop()
 
         # Cancel all pipelines currently in pipeline queue
         logging.info("Canceling all currently running jobs...")
@@ -167,11 +203,16 @@ class DaemonManager:
         # Otherwise just stop all threads and quit
         self.report_worker.stop()
         self.run_worker.stop()
+        self.cancel_worker.stop()
 
         # Wait for everything to stop
-        while not self.run_worker.is_stopped() or not self.report_worker.is_stopped():
+        while not self.run_worker.is_stopped() or not self.report_worker.is_stopped() or not self.cancel_worker.is_stopped():
             time.sleep(1)
 
+        # Destroy any warm processors that are still waiting to be used
+        logging.info("Destroying warm processor pools...")
+        self.platform_factory.stop_processor_pools()
+
     def report_failure(self, err_msg=None):
         logging.info("Emailing recipients about CC-Daemon failure...")
 
@@ -199,6 +240,7 @@ class DaemonManager:
             config = self.__read_config().pop("pipeline_queue")
             max_cpus    = config["max_cpus"]
             max_loading = config["max_loading"]
+            max_staged  = config["max_staged"]
 
             if max_cpus != self.pipeline_queue.max_cpus:
                 logging.info("Updating pipeline queue CPU limit from %d to %d!" %
@@ -210,6 +252,11 @@ class DaemonManager:
                              (self.pipeline_queue.load_limit, max_loading))
                 self.pipeline_queue.set_max_loading(max_loading)
 
+            if max_staged != self.pipeline_queue.max_staged:
+                logging.info("Updating pipeline queue staging limit from %d to %d!" %
+                             (self.pipeline_queue.max_staged, max_staged))
+                self.pipeline_queue.set_max_staged(max_staged)
+
 
         except BaseException, e:
             logging.error("(CCDaemon) Unable to refresh pipeline queue from config file!")
@@ -230,7 +277,19 @@ class DaemonManager:
                         password=config["password"],
                         database=config["database"],
                         host=config["host"],
-                        mysql_driver=config["mysql_driver"])
+                        mysql_driver=config["mysql_driver"],
+                        max_buffered_updates=config["max_buffered_updates"],
+                        config_cache_size=config["config_cache_size"],
+                        config_cache_ttl=config["config_cache_ttl"],
+                        slow_query_threshold=config["slow_query_threshold"],
+                        monitor_tag="CCDaemon",
+                        pool_size=config["pool_size"],
+                        max_overflow=config["max_overflow"],
+                        pool_pre_ping=config["pool_pre_ping"],
+                        pool_recycle=config["pool_recycle"],
+                        replica_host=config["replica_host"],
+                        archive_after_days=config["archive_after_days"],
+                        archive_batch_size=config["archive_batch_size"])
 
     def __init_pipeline_queue(self):
         # Initialize pipeline queue
@@ -238,7 +297,8 @@ class DaemonManager:
         config          = self.config.pop("pipeline_queue")
         max_cpus        = config["max_cpus"]
         load_limit      = config["max_loading"]
-        return PipelineQueue(max_cpus, load_limit)
+        max_staged      = config["max_staged"]
+        return PipelineQueue(max_cpus, load_limit, max_staged)
 
     def __init_platform_factory(self):
         logging.info("(CCDaemon) Initializing PlatformFactory...")
@@ -269,23 +329,21 @@ class DaemonManager:
 
         # Pipelines with these stati won't be touched
         acceptable_statuses = [PipelineStatus.FAILED, PipelineStatus.IDLE, PipelineStatus.SUCCESS]
+        orphan_statuses     = [status for status in PipelineStatus.status_list if status not in acceptable_statuses]
 
         try:
             # Create new database session
             with self.db_helper.session_context() as session:
-                # Get all pipelines in DB
-                pipelines = self.db_helper.get_pipeline(session)
-
-                # Loop through and update status of each
-                for pipeline in pipelines:
-                    if pipeline.status.description.upper() not in acceptable_statuses:
-                        logging.info("Orphaned pipeline to be updated: %s" % pipeline.analysis_id)
-
-                        # Set status to FAILED
-                        self.db_helper.update_status(pipeline, status=PipelineStatus.FAILED)
-
-                        # Set error to type to OTHER and indicate that orphaned pipeline was detected by daemon
-                        self.db_helper.update_error_type(pipeline, error_type=PipelineError.OTHER, extra_error_msg="Orphaned pipeline updated upon daemon start!")
+                # Set status of every orphaned pipeline to FAILED in a single update
+                # Set error to type to OTHER and indicate that orphaned pipeline was detected by daemon
+                orphan_ids = self.db_helper.bulk_update_status(session,
+                                                               from_statuses=orphan_statuses,
+                                                               status=PipelineStatus.FAILED,
+                                                               error_type=PipelineError.OTHER,
+                                                               extra_error_msg="Orphaned pipeline updated upon daemon start!")
+
+            if len(orphan_ids) > 0:
+                logging.info("Updated %d orphaned pipelines: %s" % (len(orphan_ids), ", ".join([str(x) for x in orphan_ids])))
 
             logging.info("Pipeline status update complete!")
 
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+class ConfigCache(object):
+    # Size-bounded LRU cache of decoded analysis type config files
+    # Entries expire after a number of seconds so edited configs are picked up without reading them on every lookup
+    def __init__(self, max_entries=32, ttl=300):
+
+        # Maximum number of entries held before least recently used entries are evicted
+        self.max_entries    = max_entries
+
+        # Seconds an entry is served after it was cached
+        self.ttl            = ttl
+
+        # Cached (value, time cached) entries ordered from least to most recently used
+        self.entries        = OrderedDict()
+        self.lock           = threading.Lock()
+
+        # Cache usage counters
+        self.hits           = 0
+        self.misses         = 0
+        self.evictions      = 0
+        self.expirations    = 0
+
+    def get(self, key):
+        # Return cached value or None if key isn't cached
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+
+            # Move entry to most recently used position unless it has expired
+            value, cache_time = self.entries.pop(key)
+            if time.time() - cache_time > self.ttl:
+                self.misses         += 1
+                self.expirations    += 1
+                return None
+
+            self.entries[key] = (value, cache_time)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            # Replace any existing entry
+            if key in self.entries:
+                self.entries.pop(key)
+            self.entries[key] = (value, time.time())
+
+            # Evict least recently used entries
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            return {"entries":      len(self.entries),
+                    "max_entries":  self.max_entries,
+                    "hits":         self.hits,
+                    "misses":       self.misses,
+                    "evictions":    self.evictions,
+                    "expirations":  self.expirations}
+
+    def __str__(self):
+        stats = self.get_stats()
+        return "ConfigCache: %d/%d entries, %d hits, %d misses, %d evictions, %d expirations" % \
+               (stats["entries"], stats["max_entries"], stats["hits"], stats["misses"], stats["evictions"], stats["expirations"])
@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime, timedelta
+
+# SQLAlchemy imports
+from sqlalchemy import MetaData, Table, Column, Index, inspect, select, func, or_
+
+# Database related classes
+from DatabaseModel import Analysis, AnalysisStatus, OutputFile, Stats
+
+class DBArchiver(object):
+    # Moves finished analyses (and their stats and output files) out of the hot tables into archive tables
+    # Keeps the tables scanned by the daemon's polling loops small as analysis history grows
+
+    # Timestamps of an analysis, latest first, used to determine when it finished
+    FINISH_TIME_COLUMNS = ["run_end", "run_start", "created"]
+
+    def __init__(self, archive_after_days=0, batch_size=500):
+
+        # Analyses finished more than this many days ago are archived. Archiving is disabled if 0.
+        self.archive_after_days = archive_after_days
+
+        # Maximum number of analyses moved per transaction
+        self.batch_size         = batch_size
+
+        # Define archive tables mirroring the hot tables
+        self.metadata           = MetaData()
+        self.analysis_archive   = self.__define_archive_table(Analysis.__table__)
+        self.stats_archive      = self.__define_archive_table(Stats.__table__)
+        self.output_archive     = self.__define_archive_table(OutputFile.__table__)
+
+        # Hot tables whose rows are moved along with each analysis. Parent table must come last.
+        self.table_pairs = [(Stats.__table__,       self.stats_archive),
+                            (OutputFile.__table__,  self.output_archive),
+                            (Analysis.__table__,    self.analysis_archive)]
+
+    def is_enabled(self):
+        return self.archive_after_days > 0
+
+    def migrate(self, engine):
+        # Create archive tables and make sure hot tables are indexed for status polling
+        logging.info("(DBArchiver) Creating analysis archive tables if they don't exist...")
+        self.metadata.create_all(engine, checkfirst=True)
+
+        # Add index on status_id to hot analysis table if it doesn't already have one
+        analysis_table  = Analysis.__table__
+        indexes         = inspect(engine).get_indexes(analysis_table.name)
+        if not any([index["column_names"][:1] == ["status_id"] for index in indexes]):
+            logging.info("(DBArchiver) Adding status_id index to '%s' table..." % analysis_table.name)
+            Index("ix_%s_status_id" % analysis_table.name, analysis_table.c.status_id).create(engine)
+
+    def archive(self, session, terminal_status_ids):
+        # Move one batch of old finished analyses to the archive tables
+        # Returns the ids of the analyses that were archived
+        cutoff = datetime.now() - timedelta(days=self.archive_after_days)
+
+        # Analyses that failed before launching have no run_start so fall back to other timestamps
+        # Analyses without any timestamp can't be aged and are archived once finished
+        finish_time = self.__get_finish_time()
+
+        # Lock analyses being archived so no stats or output files can be added to them until they've been moved
+        pipeline_ids = [row.analysis_id for row in
+                        session.query(Analysis.analysis_id).
+                        filter(Analysis.status_id.in_(terminal_status_ids)).
+                        filter(or_(finish_time < cutoff, finish_time == None)).
+                        order_by(Analysis.analysis_id).
+                        limit(self.batch_size).
+                        with_for_update().
+                        all()]
+
+        if len(pipeline_ids) == 0:
+            return pipeline_ids
+
+        # Copy rows to archive tables
+        # Stats and output files of every analysis in the batch are moved in the same transaction as the analysis
+        for hot_table, archive_table in reversed(self.table_pairs):
+            columns = [hot_table.c[col.name] for col in archive_table.columns]
+            session.execute(archive_table.insert().
+                            from_select([col.name for col in archive_table.columns],
+                                        select(columns).where(hot_table.c.analysis_id.in_(pipeline_ids))))
+
+        # Remove rows from hot tables, children first
+        for hot_table, _ in self.table_pairs:
+            session.execute(hot_table.delete().where(hot_table.c.analysis_id.in_(pipeline_ids)))
+
+        return pipeline_ids
+
+    def archived_pipeline_exists(self, session, pipeline_id):
+        # Return true if the archive contains pipeline with the id specified
+        query = select([self.analysis_archive.c.analysis_id]).\
+                    where(self.analysis_archive.c.analysis_id == pipeline_id)
+        return session.execute(query).first() is not None
+
+    def get_archived_status(self, session, pipeline_id):
+        # Return status description of an archived pipeline or None if it isn't archived
+        query = select([AnalysisStatus.description]).\
+                    where(AnalysisStatus.status_id == self.analysis_archive.c.status_id).\
+                    where(self.analysis_archive.c.analysis_id == pipeline_id)
+        row = session.execute(query).first()
+        return None if row is None else row[0]
+
+    def __get_finish_time(self):
+        # Return expression for the latest timestamp an analysis has
+        columns = [Analysis.__table__.c[name] for name in self.FINISH_TIME_COLUMNS if name in Analysis.__table__.c]
+        if len(columns) == 1:
+            return columns[0]
+        return func.coalesce(*columns)
+
+    def __define_archive_table(self, table):
+        # Copy column definitions of a hot table without constraints to other hot tables
+        columns = [Column(col.name, col.type, primary_key=col.primary_key, nullable=col.nullable, autoincrement=False)
+                   for col in table.columns]
+        archive_table = Table("%s_archive" % table.name, self.metadata, *columns)
+
+        # Index archived rows by analysis and status for transparent lookups
+        if not archive_table.c.analysis_id.primary_key:
+            Index("ix_%s_archive_analysis_id" % table.name, archive_table.c.analysis_id)
+        if "status_id" in archive_table.c:
+            Index("ix_%s_archive_status_id" % table.name, archive_table.c.status_id)
+
+        return archive_table
@@ -0,0 +1,46 @@
+import logging
+from datetime import datetime
+
+# SQLAlchemy imports
+from sqlalchemy import MetaData, Table, Column, Integer, DateTime, select, func
+
+class DBCancelSignals(object):
+    # Append-only table of cancellation requests
+    # Signal ids increase monotonically so the daemon only has to read signals newer than the last one it saw
+
+    def __init__(self):
+
+        self.metadata   = MetaData()
+        self.table      = Table("analysis_cancel_signal", self.metadata,
+                                Column("signal_id",         Integer, primary_key=True, autoincrement=True),
+                                Column("analysis_id",       Integer, nullable=True),
+                                Column("analysis_type_id",  Integer, nullable=True),
+                                Column("created",           DateTime, nullable=False))
+
+    def migrate(self, engine):
+        # Create cancellation signal table if it doesn't exist
+        logging.info("(DBCancelSignals) Creating cancellation signal table if it doesn't exist...")
+        self.metadata.create_all(engine, checkfirst=True)
+
+    def exists(self, engine):
+        # Determine whether cancellation signal table has been created
+        with engine.connect() as connection:
+            return engine.dialect.has_table(connection, self.table.name)
+
+    def signal(self, session, pipeline_id=None, analysis_type_id=None):
+        # Add a signal to cancel a single pipeline or every pipeline of an analysis type
+        session.execute(self.table.insert().values(analysis_id=pipeline_id,
+                                                   analysis_type_id=analysis_type_id,
+                                                   created=datetime.now()))
+
+    def get_last_signal_id(self, session):
+        # Return the id of the most recent signal or 0 if no signals exist
+        last_signal_id = session.execute(select([func.max(self.table.c.signal_id)])).scalar()
+        return 0 if last_signal_id is None else last_signal_id
+
+    def get_signals(self, session, min_signal_id):
+        # Return signals newer than min_signal_id ordered from oldest to newest
+        query = select([self.table.c.signal_id, self.table.c.analysis_id, self.table.c.analysis_type_id]).\
+                    where(self.table.c.signal_id > min_signal_id).\
+                    order_by(self.table.c.signal_id)
+        return session.execute(query).fetchall()
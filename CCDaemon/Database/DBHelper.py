@@ -1,50 +1,123 @@
 import base64
 import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
 from contextlib import contextmanager
 
 # SQLAlchemy imports
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select, bindparam
 from sqlalchemy.engine.url import URL
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
 
 # Database related classes
-from DatabaseModel import Analysis
+from DatabaseModel import Analysis, AnalysisType
 from DatabaseModel import AnalysisError
 from DatabaseModel import File, OutputFile, Stats
 from DatabaseModel import AnalysisStatus
 from CCDaemon.Database.DBError import DBError
+from CCDaemon.Database.ConfigCache import ConfigCache
+from CCDaemon.Database.DBMonitor import DBMonitor
+from CCDaemon.Database.DBArchiver import DBArchiver
+from CCDaemon.Database.DBCancelSignals import DBCancelSignals
 
 # Pipeline Error and Status classes
 from CCDaemon.Pipeline import PipelineError
 from CCDaemon.Pipeline import PipelineStatus
+from CCDaemon.Pipeline import PipelineSnapshot
+
+# Lightweight row returned by polling queries
+PipelineRow = namedtuple("PipelineRow", ["analysis_id", "status_id", "cpus", "max_run_time"])
 
 class DBHelper(object):
 
-    def __init__(self, username, password, database, host, mysql_driver):
-        # Create URL object to connect to database
-        self.url = URL(mysql_driver, username=username, password=password, database=database, host=host)
+    def __init__(self, username, password, database, host, mysql_driver, max_buffered_updates=500, config_cache_size=32, config_cache_ttl=300,
+                 slow_query_threshold=1.0, monitor_tag="CLI", pool_size=5, max_overflow=10, pool_pre_ping=True,
+                 pool_recycle=3600, replica_host=None, sync=True, archive_after_days=0, archive_batch_size=500, engine=None):
+        # Create URL object to connect to database unless an existing engine was provided
+        self.url = None
+        if engine is None:
+            self.url = URL(mysql_driver, username=username, password=password, database=database, host=host)
+
+        # Create URL object to connect to read-only replica used for polling queries
+        self.replica_url = None
+        if replica_host is not None and engine is None:
+            self.replica_url = URL(mysql_driver, username=username, password=password, database=database, host=replica_host)
+
+        # Connection pool settings
+        self.pool_size      = pool_size
+        self.max_overflow   = max_overflow
+        self.pool_pre_ping  = pool_pre_ping
+        self.pool_recycle   = pool_recycle
+
+        # LRU cache of decoded analysis type config files
+        self.config_cache = ConfigCache(max_entries=config_cache_size, ttl=config_cache_ttl)
+
+        # Statement and connection pool instrumentation
+        self.monitor = DBMonitor(slow_query_threshold=slow_query_threshold, default_tag=monitor_tag)
 
-        # Generate a session maker
-        self.session_factory = sessionmaker()
+        # Mover of old finished analyses to archive tables
+        self.archiver = DBArchiver(archive_after_days=archive_after_days, batch_size=archive_batch_size)
+
+        # Table of cancellation requests polled by the daemon
+        self.cancel_signals = DBCancelSignals()
+
+        # Generate session makers for read/write and read-only sessions
+        self.session_factory        = sessionmaker()
+        self.read_session_factory   = sessionmaker()
 
         # Establish a connection
-        self.db_con = self.connect()
+        if engine is not None:
+            self.db_con = self.use_engine(engine, self.session_factory, name="primary")
+        else:
+            self.db_con = self.connect(self.url, self.session_factory, name="primary")
+
+        # Route read-only sessions to the replica if one was provided
+        if self.replica_url is not None:
+            self.read_con = self.connect(self.replica_url, self.read_session_factory, name="replica")
+        else:
+            self.read_con = self.db_con
+            self.read_session_factory.configure(bind=self.db_con)
 
         # Sync statuses ids
         self.statuses = {}
-        self.sync_statuses()
 
         # Synch error types
         self.error_types = {}
-        self.sync_error_types()
 
-    def connect(self, echo=False):
+        # Lightweight helpers (e.g. CLIs) sync only the statuses and error types they need
+        if sync:
+            self.sync_statuses()
+            self.sync_error_types()
+
+        # Core statements used by polling loops and cache of their compiled forms
+        self.compiled_cache         = {}
+        self.idle_rows_query        = None
+        self.pipeline_rows_query    = None
+        self.snapshot_query         = None
+        self.__init_polling_queries()
+
+        # Write-behind buffer of pipeline column updates (analysis_id -> {column: value})
+        self.buffered_updates       = OrderedDict()
+        self.buffer_lock            = threading.Lock()
+        self.max_buffered_updates   = max_buffered_updates
+
+        # Held from taking the buffer until it's committed so a flush waits for flushes already in flight
+        self.flush_lock             = threading.Lock()
+
+    def connect(self, url, session_factory, name="primary", echo=False):
 
         # Create an engine
         try:
-            logging.info("(DBHelper) Creating database connection engine to connect to database!" )
-            engine = create_engine(self.url, echo=echo)
+            logging.info("(DBHelper) Creating %s database connection engine to connect to database!" % name)
+            engine = create_engine(url,
+                                   echo=echo,
+                                   pool_size=self.pool_size,
+                                   max_overflow=self.max_overflow,
+                                   pool_pre_ping=self.pool_pre_ping,
+                                   pool_recycle=self.pool_recycle)
+            self.monitor.attach(engine, name=name, pool_capacity=self.pool_size + self.max_overflow)
 
         except BaseException, e:
             logging.error("Unable to connect to database!")
@@ -56,7 +129,7 @@ class DBHelper(object):
         # Bind the engine to the session factory
         try:
             logging.info("(DBHelper) Creating the session factory for the database connection!")
-            self.session_factory.configure(bind=engine)
+            session_factory.configure(bind=engine)
 
         except BaseException, e:
             logging.error("Unable to create the session factory!")
@@ -69,9 +142,23 @@ class DBHelper(object):
         logging.info("(DBHelper) Successfully connect to database!")
         return engine
 
+    @staticmethod
+    def from_engine(engine, **kwargs):
+        # Create a database helper using an existing engine instead of connecting to MySQL (e.g. SQLite in benchmarks)
+        return DBHelper(username=None, password=None, database=None, host=None, mysql_driver=None, engine=engine, **kwargs)
+
+    def use_engine(self, engine, session_factory, name="primary"):
+        # Bind an existing engine to the session factory
+        logging.info("(DBHelper) Using existing %s database connection engine!" % name)
+        self.monitor.attach(engine, name=name)
+        session_factory.configure(bind=engine)
+        return engine
+
     def disconnect(self):
 
         self.db_con.dispose()
+        if self.read_con is not self.db_con:
+            self.read_con.dispose()
 
     def get_pipeline(self, session, pipeline_id=None, status=None):
 
@@ -95,11 +182,77 @@ class DBHelper(object):
         return session.query(Analysis).\
                         all()
 
-    def sync_statuses(self):
+    def get_idle_pipelines(self, session, min_id=None):
+        # Return PipelineRows for IDLE pipelines ordered by id
+        # Only pipelines with an id greater than min_id are returned if min_id is provided
+        min_id = -1 if min_id is None else min_id
+        return self.__execute_polling_query(session, self.idle_rows_query,
+                                            status_id=self.statuses[PipelineStatus.IDLE],
+                                            min_id=min_id)
+
+    def get_pipeline_rows(self, session, pipeline_ids):
+        # Return PipelineRows for a list of pipelines in a single query
+        if len(pipeline_ids) == 0:
+            return []
+        return self.__execute_polling_query(session, self.pipeline_rows_query, pipeline_ids=list(pipeline_ids))
+
+    def get_pipeline_snapshot(self, session, pipeline_id):
+        # Return a detached, immutable snapshot of a pipeline and its analysis type using a single query
+        connection  = session.connection().execution_options(compiled_cache=self.compiled_cache)
+        row         = connection.execute(self.snapshot_query, pipeline_id=pipeline_id).first()
+
+        # Raise DB error if no pipelines found with ID
+        if row is None:
+            raise DBError("No pipelines found with id: '%s'" % pipeline_id)
+
+        return PipelineSnapshot(**dict(row.items()))
+
+    def __init_polling_queries(self):
+        # Build Core statements for polling reads that don't need full ORM objects
+        analysis        = Analysis.__table__
+        analysis_type   = AnalysisType.__table__
+
+        base_query = select([analysis.c.analysis_id,
+                             analysis.c.status_id,
+                             analysis_type.c.cpus,
+                             analysis_type.c.max_run_time]).\
+                        select_from(analysis.join(analysis_type,
+                                                  analysis.c.analysis_type_id == analysis_type.c.analysis_type_id))
+
+        self.idle_rows_query = base_query.\
+                                where(analysis.c.status_id == bindparam("status_id")).\
+                                where(analysis.c.analysis_id > bindparam("min_id")).\
+                                order_by(analysis.c.analysis_id)
+
+        self.pipeline_rows_query = base_query.\
+                                    where(analysis.c.analysis_id.in_(bindparam("pipeline_ids", expanding=True)))
+
+        # Everything a pipeline runner needs, without any config blobs
+        self.snapshot_query = select([analysis.c.analysis_id,
+                                      analysis.c.name,
+                                      analysis.c.status_id,
+                                      analysis.c.git_commit,
+                                      analysis.c.final_output_dir,
+                                      analysis.c.analysis_type_id,
+                                      analysis_type.c.cpus,
+                                      analysis_type.c.max_run_time]).\
+                                select_from(analysis.join(analysis_type,
+                                                          analysis.c.analysis_type_id == analysis_type.c.analysis_type_id)).\
+                                where(analysis.c.analysis_id == bindparam("pipeline_id"))
+
+    def __execute_polling_query(self, session, query, **params):
+        # Run a polling statement on the session's connection, reusing its compiled form
+        connection = session.connection().execution_options(compiled_cache=self.compiled_cache)
+        return [PipelineRow(*row) for row in connection.execute(query, **params)]
+
+    def sync_statuses(self, statuses=None):
+
+        # Sync every status unless specific ones were requested
+        statuses = PipelineStatus.status_list if statuses is None else statuses
 
         with self.session_context() as session:
 
-            for status in PipelineStatus.status_list:
+            for status in statuses:
                 # Add analysis status if not present in DB
                 if len(session.query(AnalysisStatus).filter(AnalysisStatus.description == status.lower()).all()) == 0:
                     session.add(AnalysisStatus(description=status.lower()))
@@ -124,11 +277,14 @@ class DBHelper(object):
 
                     raise DBError("There is no status with name '%s' defined in the DB" % status)
 
-    def sync_error_types(self):
+    def sync_error_types(self, error_types=None):
+
+        # Sync every error type unless specific ones were requested
+        error_types = PipelineError.error_types if error_types is None else error_types
 
         with self.session_context() as session:
 
-            for error_type in PipelineError.error_types:
+            for error_type in error_types:
                 # Add analysis status if not present in
                 if len(session.query(AnalysisError).filter(AnalysisError.error_type == error_type.lower()).all()) == 0:
                     # Get error message associated with error type
@@ -170,6 +326,148 @@ class DBHelper(object):
         if error_type not in self.error_types:
             raise DBError("No error type with name %s is defined in the database" % error_type)
 
+        # Update the status of the pipeline
+        pipeline.error_id   = self.error_types[error_type]
+        pipeline.error_msg  = self.get_error_msg(error_type, extra_error_msg)
+
+    def bulk_update_status(self, session, from_statuses, status, error_type=None, extra_error_msg="", analysis_type_id=None):
+        # Set the status (and optionally error) of every pipeline currently in one of from_statuses
+        # Only pipelines of one analysis type are updated if analysis_type_id is provided
+        # Done with a single UPDATE statement. Returns the ids of the pipelines that were updated.
+
+        for curr_status in from_statuses + [status]:
+            if curr_status not in self.statuses:
+                raise DBError("No status with name %s is defined in the database!" % curr_status)
+
+        if error_type is not None and error_type not in self.error_types:
+            raise DBError("No error type with name %s is defined in the database" % error_type)
+
+        # Get ids of pipelines to update so they can be reported
+        # Rows are locked until the transaction ends so their status can't change before they're updated
+        from_status_ids = [self.statuses[curr_status] for curr_status in from_statuses]
+        pipeline_filter = [Analysis.status_id.in_(from_status_ids)]
+        if analysis_type_id is not None:
+            pipeline_filter.append(Analysis.analysis_type_id == analysis_type_id)
+
+        pipeline_ids    = [row.analysis_id for row in
+                           session.query(Analysis.analysis_id).
+                           filter(*pipeline_filter).
+                           with_for_update().
+                           all()]
+
+        if len(pipeline_ids) == 0:
+            return pipeline_ids
+
+        # Generate column updates
+        values = {Analysis.status_id: self.statuses[status]}
+        if error_type is not None:
+            values[Analysis.error_id]   = self.error_types[error_type]
+            values[Analysis.error_msg]  = self.get_error_msg(error_type, extra_error_msg)
+
+        # Update exactly the pipelines that were selected at once
+        session.query(Analysis).\
+            filter(Analysis.analysis_id.in_(pipeline_ids)).\
+            update(values, synchronize_session=False)
+
+        return pipeline_ids
+
+    def buffer_update(self, pipeline_id, **values):
+        # Queue column updates for a pipeline to be written on the next flush
+        # Later updates to the same column of the same pipeline overwrite earlier ones
+        with self.buffer_lock:
+            if pipeline_id not in self.buffered_updates:
+                self.buffered_updates[pipeline_id] = {}
+            self.buffered_updates[pipeline_id].update(values)
+            buffer_full = len(self.buffered_updates) >= self.max_buffered_updates
+
+        # Write updates immediately if too many pipelines are waiting
+        if buffer_full:
+            logging.debug("(DBHelper) Write buffer full! Flushing buffered updates...")
+            self.flush_updates()
+
+    def buffer_status(self, pipeline_id, status):
+
+        # Do not set the
+        if status not in self.statuses:
+            raise DBError("No status with name %s is defined in the database!" % status)
+
+        self.buffer_update(pipeline_id, status_id=self.statuses[status])
+
+    def buffer_error_type(self, pipeline_id, error_type, extra_error_msg=""):
+
+        # Do not set the
+        if error_type not in self.error_types:
+            raise DBError("No error type with name %s is defined in the database" % error_type)
+
+        self.buffer_update(pipeline_id,
+                           error_id=self.error_types[error_type],
+                           error_msg=self.get_error_msg(error_type, extra_error_msg))
+
+    def flush_updates(self):
+        # Write all buffered pipeline updates to the database in a single transaction
+        # Returns once every update buffered before the call has been written, even if another thread was flushing them
+        with self.flush_lock:
+            self.__flush_updates()
+
+    def __flush_updates(self):
+
+        # Take ownership of current buffer so other threads can keep buffering
+        with self.buffer_lock:
+            updates = self.buffered_updates
+            self.buffered_updates = OrderedDict()
+
+        if len(updates) == 0:
+            return
+
+        # Active statuses must never overwrite a cancellation requested from outside the daemon
+        cancelling_id       = self.statuses[PipelineStatus.CANCELLING]
+        guarded_status_ids  = [self.statuses[status] for status in
+                               [PipelineStatus.READY, PipelineStatus.LOADING, PipelineStatus.RUNNING]]
+
+        # Statuses and errors must never overwrite the results of a pipeline that has already been reported
+        result_columns      = ["status_id", "error_id", "error_msg"]
+
+        try:
+            with self.session_context() as session:
+                for pipeline_id, values in updates.iteritems():
+                    values = dict(values)
+
+                    # Only move to an active status if pipeline hasn't been cancelled in the meantime
+                    if values.get("status_id") in guarded_status_ids:
+                        session.query(Analysis).\
+                            filter(Analysis.analysis_id == pipeline_id).\
+                            filter(Analysis.status_id != cancelling_id).\
+                            filter(Analysis.cost == None).\
+                            update({"status_id": values.pop("status_id")}, synchronize_session=False)
+
+                    result_values = dict([(column, values.pop(column)) for column in result_columns if column in values])
+                    if len(result_values) > 0:
+                        session.query(Analysis).\
+                            filter(Analysis.analysis_id == pipeline_id).\
+                            filter(Analysis.cost == None).\
+                            update(result_values, synchronize_session=False)
+
+                    if len(values) > 0:
+                        session.query(Analysis).\
+                            filter(Analysis.analysis_id == pipeline_id).\
+                            update(values, synchronize_session=False)
+
+        except BaseException:
+            # Put updates back in front of anything buffered since so they're retried on the next flush
+            # Retried statuses and errors still can't overwrite a report written in the meantime
+            with self.buffer_lock:
+                for pipeline_id, values in self.buffered_updates.iteritems():
+                    if pipeline_id in updates:
+                        updates[pipeline_id].update(values)
+                    else:
+                        updates[pipeline_id] = values
+                self.buffered_updates = updates
+            raise
+
+        logging.debug("(DBHelper) Flushed buffered updates for %d pipelines!" % len(updates))
+
+    @staticmethod
+    def get_error_msg(error_type, extra_error_msg=""):
         # Generate baseline error message
         error_msg = PipelineError.error_msgs[error_type]
 
@@ -177,70 +475,161 @@ class DBHelper(object):
         if extra_error_msg != "":
             error_msg += "\n%s" % extra_error_msg
 
-        # Update the status of the pipeline
-        pipeline.error_id   = self.error_types[error_type]
-        pipeline.error_msg  = error_msg
+        return error_msg
 
-    @staticmethod
-    def pipeline_exists(session, pipeline_id):
+    def pipeline_exists(self, session, pipeline_id, include_archived=False):
 
         # Return true if database contains pipeline with the id specified
-        pipelines = session.query(Analysis). \
-            filter(Analysis.analysis_id == pipeline_id).all()
+        pipeline = session.query(Analysis.analysis_id). \
+            filter(Analysis.analysis_id == pipeline_id).first()
 
-        return len(pipelines) > 0
+        if pipeline is not None:
+            return True
 
-    @staticmethod
-    def register_output_file(pipeline, out_file):
-        # Add an additonal output file to a pipeline in the database
-        output      = OutputFile(task_id=out_file.get_node_id())
-        output.file = File(file_type=out_file.get_filetype(), path=out_file.get_path())
-        output.analysis = pipeline
+        # Look for pipeline in the archive if requested
+        if include_archived and self.archiver.is_enabled():
+            return self.archiver.archived_pipeline_exists(session, pipeline_id)
 
-    @staticmethod
-    def register_qc_stat(pipeline, qc_stat):
-        # Add a qc stat entry for a pipeline
-        stat = Stats(sample_id=qc_stat.get_sample_id(),
-                     key=qc_stat.get_key(),
-                     value=qc_stat.get_value(),
-                     input_file=qc_stat.get_input_file(),
-                     task_id=qc_stat.get_task_id(),
-                     notes=qc_stat.get_notes())
-        stat.analysis = pipeline
+        return False
 
-    @staticmethod
-    def get_config_file_strings(pipeline):
-        # Get string representations of GAP config files
-        config_strings  = {}
-        config_strings["graph"]           = DBHelper.get_config_file(pipeline, "graph")
-        config_strings["resource_kit"]    = DBHelper.get_config_file(pipeline, "resource_kit")
-        config_strings["platform"]        = DBHelper.get_config_file(pipeline, "platform")
-        config_strings["sample_sheet"]    = DBHelper.get_config_file(pipeline, "sample_sheet")
-        return config_strings
+    def get_pipeline_status(self, session, pipeline_id):
+        # Return status of a pipeline whether it's active or archived
+        status = session.query(AnalysisStatus.description).\
+                    join(Analysis, Analysis.status_id == AnalysisStatus.status_id).\
+                    filter(Analysis.analysis_id == pipeline_id).\
+                    scalar()
 
-    @staticmethod
-    def get_config_file(pipeline, config_type):
+        if status is None and self.archiver.is_enabled():
+            status = self.archiver.get_archived_status(session, pipeline_id)
 
-        config = None
+        if status is None:
+            raise DBError("No pipelines found with id: '%s'" % pipeline_id)
 
-        if config_type == "graph":
-            config = pipeline.analysis_type.graph_config
+        return status.upper()
 
-        elif config_type == "resource_kit":
-            config = pipeline.analysis_type.resource_kit
+    def migrate_cancel_signals(self):
+        # Create cancellation signal table
+        self.cancel_signals.migrate(self.db_con)
 
-        elif config_type == "platform":
-            config = pipeline.analysis_type.platform_config
+    def cancel_signals_exist(self):
+        # Determine whether cancellation signal table has been created by the daemon
+        return self.cancel_signals.exists(self.db_con)
 
-        elif config_type == "sample_sheet":
-            config = pipeline.sample_sheet
+    def signal_cancel(self, session, pipeline_id=None, analysis_type_id=None):
+        # Notify the daemon that a pipeline (or all pipelines of an analysis type) have been cancelled
+        if pipeline_id is None and analysis_type_id is None:
+            raise DBError("Cancellation signal requires a pipeline id or an analysis type id!")
+        self.cancel_signals.signal(session, pipeline_id=pipeline_id, analysis_type_id=analysis_type_id)
 
-        else:
-            logging.error("DBHelper attempted to get config file of type '%s'." % config_type)
-            logging.error(
-                "Must be of following type: 'graph', 'resource_kit', 'platform', 'sample_sheet'.")
-            raise DBError("Invalid config type requested from database: %s" % config_type)
+    def get_last_cancel_signal_id(self, session):
+        return self.cancel_signals.get_last_signal_id(session)
+
+    def get_cancel_signals(self, session, min_signal_id):
+        # Return cancellation signals newer than min_signal_id
+        return self.cancel_signals.get_signals(session, min_signal_id)
+
+    def migrate_archive(self):
+        # Create archive tables and required indexes
+        self.archiver.migrate(self.db_con)
 
+    def archive_pipelines(self, session):
+        # Move one batch of old finished pipelines to the archive. Returns the ids of archived pipelines.
+        terminal_status_ids = [self.statuses[PipelineStatus.SUCCESS], self.statuses[PipelineStatus.FAILED]]
+        return self.archiver.archive(session, terminal_status_ids)
+
+    @staticmethod
+    def register_output_files(session, pipeline, out_files):
+        # Add output files of a pipeline to the database without building ORM objects
+        # File ids are generated by the database so files are inserted one lightweight statement at a time,
+        # while the rows linking them to the pipeline are inserted with a single executemany
+        # Returns the number of output files added
+        file_key        = OutputFile.file.property.local_remote_pairs[0][0].key
+        analysis_key    = OutputFile.analysis.property.local_remote_pairs[0][0].key
+
+        links = []
+        for out_file in out_files:
+            result = session.execute(File.__table__.insert().values(file_type=out_file.get_filetype(),
+                                                                    path=out_file.get_path()))
+            links.append({"task_id":    out_file.get_node_id(),
+                          file_key:     result.inserted_primary_key[0],
+                          analysis_key: pipeline.analysis_id})
+
+        if len(links) > 0:
+            session.execute(OutputFile.__table__.insert(), links)
+
+        return len(links)
+
+    @staticmethod
+    def register_qc_stats(session, pipeline, qc_stats, batch_size=1000):
+        # Bulk insert qc stat entries for a pipeline in batches of executemany inserts
+        # Duplicate stats (same sample, key, task, and input file) are only inserted once
+        # Returns the number of qc stats actually inserted
+        stats_seen  = set()
+        batch       = []
+        num_added   = 0
+
+        for qc_stat in qc_stats:
+
+            # Skip stats that have already been added
+            stat_id = (qc_stat.get_sample_id(), qc_stat.get_key(), qc_stat.get_task_id(), qc_stat.get_input_file())
+            if stat_id in stats_seen:
+                continue
+            stats_seen.add(stat_id)
+
+            # Add plain row mapping instead of building an ORM object for every stat
+            batch.append({"analysis_id":    pipeline.analysis_id,
+                          "sample_id":      qc_stat.get_sample_id(),
+                          "key":            qc_stat.get_key(),
+                          "value":          qc_stat.get_value(),
+                          "input_file":     qc_stat.get_input_file(),
+                          "task_id":        qc_stat.get_task_id(),
+                          "notes":          qc_stat.get_notes()})
+
+            # Flush full batches to the database
+            if len(batch) >= batch_size:
+                session.bulk_insert_mappings(Stats, batch)
+                num_added += len(batch)
+                batch = []
+
+        # Flush any remaining stats
+        if len(batch) > 0:
+            session.bulk_insert_mappings(Stats, batch)
+            num_added += len(batch)
+
+        return num_added
+
+    def get_config_file_strings(self, session, pipeline):
+        # Get string representations of GAP config files
+        # Analysis type configs are shared by many pipelines so decoded copies are cached
+        # Cached configs expire after a while so edits to an analysis type are picked up
+        analysis_type_id = pipeline.analysis_type_id
+        type_configs = self.config_cache.get(analysis_type_id)
+
+        if type_configs is None:
+            # Only read and decode config blobs on a cache miss
+            row = session.query(AnalysisType.graph_config,
+                                AnalysisType.resource_kit,
+                                AnalysisType.platform_config).\
+                    filter(AnalysisType.analysis_type_id == analysis_type_id).\
+                    one()
+
+            type_configs = {"graph":         self.decode_config(row.graph_config),
+                            "resource_kit":  self.decode_config(row.resource_kit),
+                            "platform":      self.decode_config(row.platform_config)}
+            self.config_cache.put(analysis_type_id, type_configs)
+
+        # Only the sample sheet is fetched for every pipeline
+        sample_sheet = session.query(Analysis.sample_sheet).\
+                        filter(Analysis.analysis_id == pipeline.analysis_id).\
+                        scalar()
+
+        # Copy cached configs because platforms modify config strings before uploading
+        config_strings = dict(type_configs)
+        config_strings["sample_sheet"] = self.decode_config(sample_sheet)
+        return config_strings
+
+    @staticmethod
+    def decode_config(config):
         # Base64 decode if returned something
         if config is not None:
             config = base64.b64decode(config)
@@ -248,14 +637,20 @@ class DBHelper(object):
         return config
 
     @contextmanager
-    def session_context(self):
+    def session_context(self, read_only=False):
+        # Read-only sessions are routed to the replica database if one is configured
 
         session = None
 
         try:
 
             # Obtain a new session
-            session = self.session_factory()
+            session = self.read_session_factory() if read_only else self.session_factory()
+
+            # Check out a connection up front so time spent waiting on the connection pool is recorded
+            checkout_start = time.time()
+            session.connection()
+            self.monitor.record_checkout(time.time() - checkout_start)
 
             # Yield the session to the context
             yield session
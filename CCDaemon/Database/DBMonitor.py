@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+
+class DBMonitor(object):
+    # Records database statement latencies, row counts, and connection checkout waits
+    # Every record is tagged with the thread (e.g. LaunchWorker, RunWorker) that issued it
+
+    # Upper bounds (seconds) of statement latency histogram buckets
+    LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]
+
+    def __init__(self, slow_query_threshold=1.0, default_tag="CLI"):
+
+        # Statements taking longer than this many seconds are logged
+        self.slow_query_threshold = slow_query_threshold
+
+        # Tag used for statements issued from the main thread
+        self.default_tag = default_tag
+
+        # Statistics for each tag
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+        # Engines being monitored (name -> (engine, max connections))
+        self.engines = {}
+
+    def attach(self, engine, name="primary", pool_capacity=None):
+        # Listen to statement execution events on an engine
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+        self.engines[name] = (engine, pool_capacity)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Stack start times in case statements are nested on the same connection
+        conn.info.setdefault("query_start_time", []).append(time.time())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.time() - conn.info["query_start_time"].pop()
+
+        # Not every DBAPI cursor reports a row count
+        num_rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount > 0 else 0
+
+        tag = self.get_tag()
+        with self.stats_lock:
+            stats = self.__get_tag_stats(tag)
+            stats["queries"]        += 1
+            stats["rows"]           += num_rows
+            stats["query_time"]     += elapsed
+            stats["max_query_time"] = max(stats["max_query_time"], elapsed)
+            stats["histogram"][self.__get_bucket(elapsed)] += 1
+            if elapsed > self.slow_query_threshold:
+                stats["slow_queries"] += 1
+
+        if elapsed > self.slow_query_threshold:
+            logging.warning("(DBMonitor) Slow query from %s took %.3f seconds:\n%s" % (tag, elapsed, statement[:1000]))
+
+    def record_checkout(self, wait_time):
+        # Record time spent waiting for a connection from the connection pool
+        with self.stats_lock:
+            stats = self.__get_tag_stats(self.get_tag())
+            stats["checkouts"]          += 1
+            stats["checkout_time"]      += wait_time
+            stats["max_checkout_time"]  = max(stats["max_checkout_time"], wait_time)
+
+    def get_tag(self):
+        # Tag database activity with the name of the worker thread responsible for it
+        curr_thread = threading.current_thread()
+        if isinstance(curr_thread, threading._MainThread):
+            return self.default_tag
+        return curr_thread.name
+
+    def get_pool_status(self):
+        # Return connection pool usage of each monitored engine
+        pool_status = {}
+        for name, (engine, pool_capacity) in self.engines.iteritems():
+            pool = engine.pool
+            # Only queue-based pools report their usage
+            if not hasattr(pool, "checkedout"):
+                continue
+            pool_status[name] = {"size":            pool.size(),
+                                 "checked_out":     pool.checkedout(),
+                                 "checked_in":      pool.checkedin(),
+                                 "overflow":        pool.overflow(),
+                                 "capacity":        pool_capacity}
+        return pool_status
+
+    def get_stats(self):
+        with self.stats_lock:
+            return dict([(tag, dict(stats)) for tag, stats in self.stats.iteritems()])
+
+    def __get_tag_stats(self, tag):
+        if tag not in self.stats:
+            self.stats[tag] = {"queries":           0,
+                               "rows":              0,
+                               "query_time":        0.0,
+                               "max_query_time":    0.0,
+                               "slow_queries":      0,
+                               "histogram":         [0] * (len(self.LATENCY_BUCKETS) + 1),
+                               "checkouts":         0,
+                               "checkout_time":     0.0,
+                               "max_checkout_time": 0.0}
+        return self.stats[tag]
+
+    def __get_bucket(self, elapsed):
+        # Return index of histogram bucket for a statement latency
+        for i, upper_bound in enumerate(self.LATENCY_BUCKETS):
+            if elapsed <= upper_bound:
+                return i
+        return len(self.LATENCY_BUCKETS)
+
+    def __str__(self):
+        bucket_names    = ["<=%gs" % upper_bound for upper_bound in self.LATENCY_BUCKETS] + [">%gs" % self.LATENCY_BUCKETS[-1]]
+        to_return       = "DBMonitor:\nWorker\tQueries\tRows\tAvgQuery(s)\tMaxQuery(s)\tSlow\tAvgCheckout(s)\tMaxCheckout(s)\tLatency(%s)\n" % \
+                          ",".join(bucket_names)
+        for tag, stats in sorted(self.get_stats().iteritems()):
+            avg_query       = stats["query_time"] / stats["queries"] if stats["queries"] > 0 else 0
+            avg_checkout    = stats["checkout_time"] / stats["checkouts"] if stats["checkouts"] > 0 else 0
+            to_return += "%s\t%d\t%d\t%f\t%f\t%d\t%f\t%f\t%s\n" % (tag,
+                                                                   stats["queries"],
+                                                                   stats["rows"],
+                                                                   avg_query,
+                                                                   stats["max_query_time"],
+                                                                   stats["slow_queries"],
+                                                                   avg_checkout,
+                                                                   stats["max_checkout_time"],
+                                                                   ",".join([str(x) for x in stats["histogram"]]))
+
+        # Add connection pool saturation
+        for name, pool in sorted(self.get_pool_status().iteritems()):
+            to_return += "Pool '%s': %d/%s connections checked out (size: %d, idle: %d, overflow: %d)\n" % \
+                         (name, pool["checked_out"], pool["capacity"], pool["size"], pool["checked_in"], pool["overflow"])
+        return to_return
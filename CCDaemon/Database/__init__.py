@@ -1,2 +1,6 @@
 from DBError import DBError
-from DBHelper import DBHelper
+from ConfigCache import ConfigCache
+from DBMonitor import DBMonitor
+from DBArchiver import DBArchiver
+from DBCancelSignals import DBCancelSignals
+from DBHelper import DBHelper, PipelineRow
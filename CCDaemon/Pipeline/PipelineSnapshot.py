@@ -0,0 +1,30 @@
+class PipelineSnapshot(object):
+    # Immutable copy of everything a PipelineRunner needs from a pipeline's database record
+    # Detached from any database session so it can be safely read from runner threads
+    __slots__ = ["analysis_id",
+                 "name",
+                 "status_id",
+                 "git_commit",
+                 "final_output_dir",
+                 "analysis_type_id",
+                 "cpus",
+                 "max_run_time"]
+
+    def __init__(self, **fields):
+        # Set every field exactly once
+        for field in self.__slots__:
+            if field not in fields:
+                raise TypeError("PipelineSnapshot missing required field: '%s'" % field)
+            object.__setattr__(self, field, fields.pop(field))
+
+        if len(fields) > 0:
+            raise TypeError("PipelineSnapshot received unexpected fields: %s" % ", ".join(fields.keys()))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PipelineSnapshot is immutable! Cannot set '%s'." % name)
+
+    def __delattr__(self, name):
+        raise AttributeError("PipelineSnapshot is immutable! Cannot delete '%s'." % name)
+
+    def __str__(self):
+        return "PipelineSnapshot(%s)" % ", ".join(["%s=%s" % (field, getattr(self, field)) for field in self.__slots__])
@@ -2,4 +2,5 @@ from PipelineOutputFile import PipelineOutputFile
 from PipelineReport import PipelineReport
 from PipelineStatus import PipelineStatus
 from PipelineError import PipelineError
-from QCReport import QCReportError, QCReport, parse_qc_report
\ No newline at end of file
+from QCReport import QCReportError, QCReport, parse_qc_report
+from PipelineSnapshot import PipelineSnapshot
\ No newline at end of file
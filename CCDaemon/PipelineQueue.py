@@ -1,7 +1,7 @@
 import threading
 from datetime import datetime
 
-from CCDaemon.Pipeline import PipelineStatus
+from CCDaemon.Pipeline import PipelineStatus, PipelineError
 
 class DuplicateKeyError(Exception):
     def __init__(self, *args, **kwargs):
@@ -13,7 +13,7 @@ class ResourceError(Exception):
 
 class PipelineQueue:
     # Container Class for holding pipeline workers actively running on the system
-    def __init__(self, max_cpus, max_loading):
+    def __init__(self, max_cpus, max_loading, max_staged=0, default_launch_time=300):
 
         # Read resource capacity options from config
         self.max_cpus       = max_cpus
@@ -23,6 +23,10 @@ class PipelineQueue:
         self.load_limit = max_loading
         assert isinstance(max_loading, int) and max_loading > 0, "PipelineQueue error: Max Loading is not an integer >0!"
 
+        # Maximum number of pipelines that can be launched speculatively before resources free up for them
+        self.max_staged = max_staged
+        assert isinstance(max_staged, int) and max_staged >= 0, "PipelineQueue error: Max Staged is not an integer >=0!"
+
         # Variables for holding current resource usage levels
         self.curr_cpus          = 0
 
@@ -30,24 +34,80 @@ class PipelineQueue:
         self.pipeline_workers       = dict()
         self.queue_lock   = threading.Lock()
 
+        # Ids of speculatively launched pipelines waiting for resources, in order of staging
+        self.staged_ids = []
+
+        # Moving averages (seconds) of platform launch time and of runtime for each analysis type
+        # Used to predict which pipelines will free their resources before a new platform could be launched
+        self.avg_launch_time    = default_launch_time
+        self.avg_runtimes       = {}
+        self.smoothing          = 0.2
+
     @property
     def __num_loading(self):
         num_loading = 0
         for pipeline_id, pipeline in self.pipeline_workers.iteritems():
-            if pipeline.get_status() in [PipelineStatus.READY, PipelineStatus.LOADING]:
+            # Staged pipelines that have finished launching aren't using a loading slot
+            if pipeline.get_status() in [PipelineStatus.READY, PipelineStatus.LOADING] and not pipeline.is_awaiting_admission():
                 num_loading += 1
         return num_loading
 
+    @property
+    def __staged_cpus(self):
+        return sum([self.pipeline_workers[pipeline_id].get_cpus() for pipeline_id in self.staged_ids])
+
+    @property
+    def __freeing_cpus(self):
+        # Return the number of CPUs expected to be freed within the time it takes to launch a platform
+        freeing_cpus = 0
+        now = datetime.now()
+        for pipeline_id, pipeline in self.pipeline_workers.iteritems():
+
+            # Staged pipelines aren't holding resources
+            if pipeline_id in self.staged_ids:
+                continue
+
+            curr_status = pipeline.get_status()
+            if curr_status in [PipelineStatus.CANCELLING, PipelineStatus.DESTROYING, PipelineStatus.FINISHED]:
+                # Pipeline is already shutting down
+                freeing_cpus += pipeline.get_cpus()
+
+            elif curr_status == PipelineStatus.RUNNING and pipeline.get_start_time() is not None:
+                # Pipeline is expected to finish or hit its runtime limit soon
+                elapsed_time    = self.__seconds_elapsed(pipeline.get_start_time(), now)
+                expected_time   = pipeline.get_max_run_time() * 3600
+                if pipeline.get_analysis_type_id() in self.avg_runtimes:
+                    expected_time = min(expected_time, self.avg_runtimes[pipeline.get_analysis_type_id()])
+                if expected_time - elapsed_time <= self.avg_launch_time:
+                    freeing_cpus += pipeline.get_cpus()
+
+        return freeing_cpus
+
     def can_add_pipeline(self, req_cpus):
         # Determine if a pipeline can be enqueued based on its resource requirements
         with self.queue_lock:
-            # Check not CPU overload
-            cpu_overload    = self.curr_cpus + req_cpus > self.max_cpus
+            # Check not CPU overload. CPUs freed up are promised to staged pipelines first.
+            cpu_overload    = self.curr_cpus + self.__staged_cpus + req_cpus > self.max_cpus
             # Check not too many pipelines currently loading
             loading_overload = 1 + self.__num_loading > self.load_limit
             return not cpu_overload and not loading_overload
 
-    def add_pipeline(self, pipeline_worker):
+    def can_stage_pipeline(self, req_cpus):
+        # Determine if a pipeline that can't be added yet should be launched speculatively
+        # True if running pipelines are expected to free enough resources before its platform is launched
+        with self.queue_lock:
+            if len(self.staged_ids) >= self.max_staged:
+                return False
+
+            # Check not too many pipelines currently loading
+            if 1 + self.__num_loading > self.load_limit:
+                return False
+
+            # Check that predicted resources aren't already promised to other staged pipelines
+            predicted_cpus = self.max_cpus - self.curr_cpus - self.__staged_cpus + self.__freeing_cpus
+            return req_cpus <= predicted_cpus
+
+    def add_pipeline(self, pipeline_worker, staged=False):
         with self.queue_lock:
 
             # Raise except if pipeline_worker already exists in queue
@@ -57,6 +117,11 @@ class PipelineQueue:
             # Add pipeline to pipeline queue
             self.pipeline_workers[str(pipeline_worker.get_id())] = pipeline_worker
 
+            # Staged pipelines don't use any resources until they're admitted
+            if staged:
+                self.staged_ids.append(str(pipeline_worker.get_id()))
+                return
+
             # Increment resource levels
             self.curr_cpus += pipeline_worker.get_cpus()
 
@@ -76,9 +141,39 @@ class PipelineQueue:
             # Remove pipeline from pipeline queue
             self.pipeline_workers.pop(str(pipeline_worker.get_id()))
 
+            # Learn how long platforms take to launch and pipelines take to run
+            self.__record_times(pipeline_worker)
+
+            # Staged pipelines never used any resources
+            if str(pipeline_id) in self.staged_ids:
+                self.staged_ids.remove(str(pipeline_id))
+                return
+
             # Free up resources
             self.curr_cpus -= pipeline_worker.get_cpus()
 
+    def admit_staged(self):
+        # Give resources to staged pipelines in the order they were staged
+        # Returns the ids of the pipelines that were admitted
+        admitted_workers = []
+        with self.queue_lock:
+            while len(self.staged_ids) > 0:
+                pipeline_worker = self.pipeline_workers[self.staged_ids[0]]
+
+                # Stop at the first staged pipeline that doesn't fit so staged pipelines run in order
+                if self.curr_cpus + pipeline_worker.get_cpus() > self.max_cpus:
+                    break
+
+                self.staged_ids.pop(0)
+                self.curr_cpus += pipeline_worker.get_cpus()
+                admitted_workers.append(pipeline_worker)
+
+        # Allow pipelines to start running outside of lock
+        for pipeline_worker in admitted_workers:
+            pipeline_worker.admit()
+
+        return [pipeline_worker.get_id() for pipeline_worker in admitted_workers]
+
     def get_pipeline(self, pipeline_id):
         with self.queue_lock:
             return self.pipeline_workers[str(pipeline_id)]
@@ -97,18 +192,19 @@ class PipelineQueue:
 
     def __str__(self):
         # Print pipeline queue
-        usage_stats = "Curr Usage: %s CPUs, %s Loading Pipelines" % (self.curr_cpus, self.__num_loading)
-        max_usage_stats = "Max Usage: %s CPUs, %s Loading Pipelines" % (self.max_cpus, self.load_limit)
+        usage_stats = "Curr Usage: %s CPUs, %s Loading Pipelines, %s Staged Pipelines" % (self.curr_cpus, self.__num_loading, len(self.staged_ids))
+        max_usage_stats = "Max Usage: %s CPUs, %s Loading Pipelines, %s Staged Pipelines" % (self.max_cpus, self.load_limit, self.max_staged)
 
-        to_return = "Pipeline\tStatus\tRuntime\n"
+        to_return = "Pipeline\tStatus\tRuntime\tStaged\n"
         pipelines = self.pipeline_workers.values()
         for pipeline in pipelines:
             # Print report for pipeline
             start_time = pipeline.get_start_time()
             runtime = 0 if start_time is None else self.__time_elapsed(start_time, datetime.now())
-            to_return += "%s\t%s\t%f\n" % (pipeline.get_id(),
-                                           pipeline.get_status(),
-                                           runtime)
+            to_return += "%s\t%s\t%f\t%s\n" % (pipeline.get_id(),
+                                               pipeline.get_status(),
+                                               runtime,
+                                               str(pipeline.get_id()) in self.staged_ids)
         # Surround by buffer string for aesthetics
         buffer_string = "*"*32
         to_return = "%s\n%s\n%s\n%s\n%s\n%s\n%s\n" % \
@@ -123,6 +219,35 @@ class PipelineQueue:
         with self.queue_lock:
             self.load_limit = new_load_limit
 
+    def set_max_staged(self, new_max_staged):
+        with self.queue_lock:
+            self.max_staged = new_max_staged
+
+    def __record_times(self, pipeline_worker):
+        # Update moving averages with the launch time and runtime of a finished pipeline
+        launch_time = pipeline_worker.get_launch_time()
+        if launch_time is not None:
+            self.avg_launch_time = self.__smooth(self.avg_launch_time, launch_time)
+
+        # Only runtimes of pipelines that succeeded are representative
+        start_time  = pipeline_worker.get_start_time()
+        end_time    = pipeline_worker.get_end_time()
+        if start_time is None or end_time is None or pipeline_worker.get_err_type() != PipelineError.NONE:
+            return
+
+        runtime             = self.__seconds_elapsed(start_time, end_time)
+        analysis_type_id    = pipeline_worker.get_analysis_type_id()
+        self.avg_runtimes[analysis_type_id] = self.__smooth(self.avg_runtimes.get(analysis_type_id, runtime), runtime)
+
+    def __smooth(self, average, value):
+        # Exponential moving average
+        return (1 - self.smoothing) * average + self.smoothing * value
+
+    @staticmethod
+    def __seconds_elapsed(start, end):
+        diff = end - start
+        return diff.days * 86400 + diff.seconds
+
     @staticmethod
     def __time_elapsed(start, end):
         # Return the number of hours that have passed between two datetime intervals
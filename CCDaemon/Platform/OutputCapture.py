@@ -0,0 +1,66 @@
+from collections import deque
+
+class OutputCapture(object):
+    # Output of one stream of a process, kept in memory up to a limit
+    # Once over the limit only the first and last limit/2 bytes are kept. Full output is written to the log file, if any.
+
+    def __init__(self, limit=0, log_fh=None):
+
+        # Maximum number of bytes kept in memory. 0 keeps everything.
+        self.limit      = limit
+
+        # Open file every chunk of output is appended to
+        self.log_fh     = log_fh
+
+        # First and last chunks of output and number of bytes dropped in between
+        self.head       = []
+        self.head_size  = 0
+        self.tail       = deque()
+        self.tail_size  = 0
+        self.truncated  = 0
+
+    def write(self, data):
+        if self.log_fh is not None:
+            self.log_fh.write(data)
+
+        # Keep everything if unbounded or until head is full
+        if self.limit <= 0 or self.head_size < self.limit / 2:
+            if self.limit > 0:
+                room = self.limit / 2 - self.head_size
+                self.head.append(data[:room])
+                self.head_size += len(data[:room])
+                data = data[room:]
+            else:
+                self.head.append(data)
+                self.head_size += len(data)
+                data = ""
+
+        if len(data) == 0:
+            return
+
+        # Tail keeps the most recent output, dropping the oldest bytes past the limit
+        self.tail.append(data)
+        self.tail_size += len(data)
+        max_tail = self.limit - self.limit / 2
+        while self.tail_size > max_tail:
+            excess = self.tail_size - max_tail
+            if len(self.tail[0]) <= excess:
+                dropped = self.tail.popleft()
+            else:
+                dropped = self.tail[0][:excess]
+                self.tail[0] = self.tail[0][excess:]
+            self.tail_size  -= len(dropped)
+            self.truncated  += len(dropped)
+
+    def is_truncated(self):
+        return self.truncated > 0
+
+    def getvalue(self):
+        if self.truncated == 0:
+            return "".join(self.head) + "".join(self.tail)
+
+        note = "\n... [%d bytes truncated" % self.truncated
+        if self.log_fh is not None:
+            note += ", full output in %s" % self.log_fh.name
+        note += "] ...\n"
+        return "".join(self.head) + note + "".join(self.tail)
@@ -3,12 +3,18 @@ import os
 import abc
 import uuid
 import time
+import tarfile
+from StringIO import StringIO
 
 from Config import Validatable
+from RetryPolicy import RetryPolicy
 
 class Platform(Validatable):
     __metaclass__ = abc.ABCMeta
 
+    # Command unpacking a bundle of files packed by pack_files from stdin
+    UNPACK_CMD = "tar --no-same-owner -xf - -C /"
+
     def __init__(self, name, config):
 
         # Call Validatable super constructor to parse config
@@ -23,12 +29,23 @@ class Platform(Validatable):
         self.cc_git_url         = self.config["cc_url"]
         self.wrk_dir            = self.standardize_dir(self.config["wrk_dir"])
 
+        # Bounds on number of warm processors kept ready for platforms with this config
+        self.warm_pool_min      = self.config.pop("warm_pool_min", 0)
+        self.warm_pool_max      = self.config.pop("warm_pool_max", 0)
+
+        # Limits of retries of failed commands and requests, shared by every platform
+        RetryPolicy.configure(budget=self.config.pop("retry_budget", 300),
+                              max_delay=self.config.pop("retry_max_delay", 120))
+
         # Define workspace filenames
         self.workspace = self.__define_workspace(self.wrk_dir)
 
         # Define workspace directory names
         self.final_output_dir   = None
 
+        # Git commit of CloudConductor installed on platform
+        self.cc_version         = None
+
         # Boolean for whether main processor has been initialized
         self.launched = False
 
@@ -38,82 +55,111 @@ class Platform(Validatable):
         # Main platform processor
         self.processor = None
 
+        # Pool of warm processors that can be used instead of creating a new processor
+        self.processor_pool = None
+
     def launch(self, cc_config_files, commit_id=None):
 
         # Loads platform capable of running pipeline
         logging.info("(%s) Creating platform..." % self.name)
         #self.processor  = self.create_processor()
 
-        # Initialize processor object
-        self.processor  = self.init_processor()
+        # Use a warm processor if one is available
+        if self.processor_pool is not None:
+            self.processor = self.processor_pool.acquire()
 
-        # Create processor object
-        self.processor.create()
+        if self.processor is None:
+            # Initialize processor object
+            self.processor  = self.init_processor()
+
+            # Create processor object
+            self.processor.create()
 
         # Specify that processor has successfully been created
         self.launched   = True
 
+        # Logs of platform commands are written to log directory created below
+        self.processor.set_log_dir(self.workspace["log_dir"])
+
+        # Make any platform-specific modifications to config files
+        logging.info("(%s) Preprocessing config files!" % self.name)
+        files_to_upload = self.preprocess_configs(cc_config_files)
+
+        # Pack CC config files together so they're uploaded in a single transfer
+        bundle = dict()
+        for file_type in files_to_upload:
+            file_string = files_to_upload[file_type]
+            if file_string is not None:
+                logging.info("(%s) Adding '%s' config to upload bundle..." % (self.name, file_type))
+                bundle[self.workspace[file_type]] = file_string
+
+        # Prepare workspace, install CC and upload configs in a single remote session
+        # Steps run as soon as the steps they depend on are done
+        # Every step is idempotent so the whole batch is re-run if a step fails
+        steps = list()
+
         # Create working and log directories
         logging.info("(%s) Creating working directory: %s!" % (self.name, self.wrk_dir))
-        self.mkdir(self.wrk_dir)
+        steps.append(("mkdir_wrk_dir", "sudo mkdir -p %s" % self.wrk_dir, []))
 
         logging.info("(%s) Creating log directory: %s!" % (self.name, self.workspace["log_dir"]))
-        self.mkdir(self.workspace["log_dir"])
-        self.processor.set_log_dir(self.workspace["log_dir"])
+        steps.append(("mkdir_log_dir", "sudo mkdir -p %s" % self.workspace["log_dir"], ["mkdir_wrk_dir"]))
 
         logging.info("(%s) Creating CC directory: %s!" % (self.name, self.workspace["cc_dir"]))
-        self.mkdir(self.workspace["cc_dir"])
+        steps.append(("mkdir_cc_dir", "sudo mkdir -p %s" % self.workspace["cc_dir"], ["mkdir_wrk_dir"]))
 
         # Grant all permissions to working directory
         logging.info("(%s) Granting write permissions!" % self.name)
-        cmd = "sudo chmod -R 777 %s" % self.wrk_dir
-        self.run_command("grant_permissions", cmd)
+        steps.append(("grant_permissions", "sudo chmod -R 777 %s" % self.wrk_dir, ["mkdir_log_dir", "mkdir_cc_dir"]))
 
-        # Create final output directory and wait to make sure it was actually created
-        if not self.path_exists(self.final_output_dir):
-            logging.info("(%s) Creating output directory: %s" % (self.name, self.final_output_dir))
-            self.mkdir(self.final_output_dir)
-            self.processor.wait()
+        # Create final output directory if it doesn't exist
+        logging.info("(%s) Creating output directory: %s" % (self.name, self.final_output_dir))
+        steps.append(("mkdir_output_dir", self.mkdir_cmd(self.final_output_dir), []))
 
-        # Install CC freshly from GitHub
+        # Install CC freshly from GitHub unless a previous attempt of this batch already has
         logging.info("(%s) Downloading CloudConductor!" % self.name)
-        cmd = "sudo git clone %s %s !LOG3!" % (self.cc_git_url, self.workspace["cc_dir"])
-        self.run_command("download_cc", cmd)
+        steps.append(("download_cc", "[ -d %s.git ] || sudo git clone %s %s !LOG3!" %
+                      (self.workspace["cc_dir"], self.cc_git_url, self.workspace["cc_dir"]), ["grant_permissions"]))
 
-        # Revert to desired commit if specified
         if commit_id is not None:
+            # Revert to desired commit if specified
             logging.info("(%s) Reverting CloudConductor to commid id: %s" % (self.name, commit_id))
-            cmd = "cd %s ; sudo git reset --hard %s" % (self.workspace["cc_dir"], commit_id)
-            self.run_command("git_reset_cc", cmd)
+            steps.append(("git_reset_cc", "cd %s ; sudo git reset --hard %s" % (self.workspace["cc_dir"], commit_id), ["download_cc"]))
+        else:
+            # Otherwise record version of CC that was installed
+            steps.append(("get_cc_version", "cd {0} ; git log -1 --pretty=%H".format(self.workspace["cc_dir"]), ["download_cc"]))
 
-        # Make any platform-specific modifications to config files
-        logging.info("(%s) Preprocessing config files!" % self.name)
-        files_to_upload = self.preprocess_configs(cc_config_files)
+        # Unpack config files streamed over stdin while CC is being downloaded
+        logging.info("(%s) Uploading %d config files to platform..." % (self.name, len(bundle)))
+        steps.append(("upload_configs", "%s <&3" % self.UNPACK_CMD, ["grant_permissions"]))
 
-        # Transfer CC config files
-        for file_type in files_to_upload:
-            file_string = files_to_upload[file_type]
-            if file_string is not None:
-                # Upload config file to platform
-                logging.info("(%s) Uploading '%s' config to platform..." % (self.name, file_type))
-                dest_path = self.workspace[file_type]
-                self.upload_config(file_string, dest_path)
-        logging.info("(%s) Platform successfully loaded!" % self.name)
+        self.processor.run_batch("launch_platform", steps, stdin_data=self.pack_files(bundle))
+        results = self.processor.wait_batch("launch_platform")
+        if "get_cc_version" in results:
+            self.cc_version = results["get_cc_version"][1].strip()
 
-    def upload_config(self, config_string, dest_path):
+        # Report how long each launch step took
+        step_times = self.processor.get_batch_times("launch_platform")
+        logging.info("(%s) Launch step times: %s" % (self.name, ", ".join(["%s %.1fs" % item for item in step_times.iteritems()])))
 
-        # Write string to local file
-        local_filename = "/tmp/upload.%s.txt" % self.generate_unique_id()
-        with open(local_filename, "w") as fh:
-            fh.write(config_string)
+        logging.info("(%s) Platform successfully loaded!" % self.name)
 
-        # Upload file
-        self.upload_file(local_filename, dest_path)
+    def upload_config(self, config_string, dest_path):
+        # Upload string to a file on the platform
+        self.upload_bundle({dest_path: config_string})
 
-        # Remove local file
-        os.remove(local_filename)
+    def upload_bundle(self, files, job_name=None):
+        # Upload files (dest_path -> contents) to the platform in a single transfer
+        # Files are packed into a tar archive in memory and streamed to the platform over stdin
+        job_name = "upload_bundle_%s" % self.generate_unique_id() if job_name is None else job_name
+        self.processor.run(job_name, self.UNPACK_CMD, stdin_data=self.pack_files(files))
+        self.processor.wait_process(job_name)
 
     def get_cc_version(self):
+        # Return version recorded when platform was launched if available
+        if self.cc_version is not None:
+            return self.cc_version
+
         cmd = "cd {0} ; git log -1 --pretty=%H".format(self.workspace["cc_dir"])
         out, err = self.run_command("get_cc_version", cmd)
         if len(err) != 0:
@@ -210,6 +256,16 @@ class Platform(Validatable):
         # Clean up the platform
         self.clean_up()
 
+    def release_processor(self):
+        # Return processor to the warm pool if platform has one, otherwise destroy it
+        if self.processor_pool is not None:
+            self.processor_pool.release(self.processor)
+        else:
+            self.processor.destroy()
+
+    def set_processor_pool(self, processor_pool):
+        self.processor_pool = processor_pool
+
     def set_final_output_dir(self, final_output_dir):
         self.final_output_dir = self.standardize_dir(final_output_dir)
 
@@ -305,6 +361,11 @@ class Platform(Validatable):
         # Make a directory if it doesn't already exists
         pass
 
+    @abc.abstractmethod
+    def mkdir_cmd(self, dir_path):
+        # Return a command that makes a directory if it doesn't already exist when run on the platform
+        pass
+
     @abc.abstractmethod
     def cat_file(self, file_path):
         # Cat a file and return it's contents
@@ -315,6 +376,22 @@ class Platform(Validatable):
     def generate_unique_id(id_len=6):
         return str(uuid.uuid4())[0:id_len]
 
+    @staticmethod
+    def pack_files(files):
+        # Return tar archive of files (absolute dest_path -> contents) as a string
+        archive_data    = StringIO()
+        archive         = tarfile.open(fileobj=archive_data, mode="w")
+        for dest_path, contents in files.iteritems():
+            if isinstance(contents, unicode):
+                contents = contents.encode("utf-8")
+            file_info       = tarfile.TarInfo(name=dest_path.lstrip("/"))
+            file_info.size  = len(contents)
+            file_info.mode  = 0644
+            file_info.mtime = time.time()
+            archive.addfile(file_info, StringIO(contents))
+        archive.close()
+        return archive_data.getvalue()
+
     @staticmethod
     def standardize_dir(dir_path):
         # Makes directory names uniform to include a single '/' at the end
@@ -1,18 +1,29 @@
 import subprocess as sp
+import time
 
 class Process(sp.Popen):
 
     def __init__(self, args, **kwargs):
         self.command        = kwargs.pop("cmd",     True)
         self.num_retries    = kwargs.pop("num_retries", 0)
+        self.stdin_data     = kwargs.pop("stdin_data", None)
+        self.output_limit   = kwargs.pop("output_limit", 0)
         super(Process, self).__init__(args,     **kwargs)
         self.complete = False
 
+        # Time process was started and waited on until complete
+        self.start_time = time.time()
+        self.end_time   = None
+
+        # Future resolving to the output of the process once it's watched by the process manager
+        self.future = None
+
     def is_complete(self):
         return self.complete
 
     def set_complete(self):
         self.complete = True
+        self.end_time = time.time()
 
     def has_failed(self):
         ret_code = self.poll()
@@ -21,5 +32,29 @@ class Process(sp.Popen):
     def get_command(self):
         return self.command
 
+    def get_start_time(self):
+        return self.start_time
+
+    def get_end_time(self):
+        return self.end_time
+
     def get_num_retries(self):
-        return self.num_retries
\ No newline at end of file
+        return self.num_retries
+
+    def get_stdin_data(self):
+        return self.stdin_data
+
+    def get_output_limit(self):
+        return self.output_limit
+
+    def get_future(self):
+        return self.future
+
+    def set_future(self, future):
+        self.future = future
+
+    def get_output(self):
+        # Wait for process to finish and return its (stdout, stderr)
+        if self.future is None:
+            return self.communicate(input=self.stdin_data)
+        return self.future.result()
@@ -0,0 +1,338 @@
+import errno
+import logging
+import os
+import select
+import threading
+
+from OutputCapture import OutputCapture
+
+class ProcessFuture(object):
+    # Result of a process being watched by the process manager
+
+    def __init__(self, process):
+        self.process    = process
+
+        # Output, or error that stopped the process from being watched, set once the process has exited
+        self.out        = None
+        self.err        = None
+        self.error      = None
+
+        self.event      = threading.Event()
+        self.callbacks  = []
+        self.lock       = threading.Lock()
+
+    def done(self):
+        return self.event.is_set()
+
+    def result(self, timeout=None):
+        # Block until process has exited and return its (stdout, stderr)
+        if not self.event.wait(timeout):
+            raise RuntimeError("Timed out waiting for process to finish!")
+        if self.error is not None:
+            raise self.error
+        return self.out, self.err
+
+    def add_done_callback(self, callback):
+        # Call callback(future) once process has exited. Called right away if it already has.
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def set_result(self, out, err, error=None):
+        with self.lock:
+            self.out        = out
+            self.err        = err
+            self.error      = error
+            self.event.set()
+            callbacks       = self.callbacks
+            self.callbacks  = []
+
+        # Callbacks run on the process manager thread so they should return quickly
+        for callback in callbacks:
+            try:
+                callback(self)
+            except BaseException, e:
+                logging.error("(ProcessManager) Process callback failed!")
+                if e.message != "":
+                    logging.error("Received the following error: %s" % e.message)
+
+
+class ProcessManager(threading.Thread):
+    # Watches the pipes and exit status of every child process from a single poll loop
+    # Output is drained as it's written and completions are delivered through futures and callbacks,
+    # so no thread has to sit in communicate() for the lifetime of a command
+
+    # Bytes read from a pipe at a time
+    READ_SIZE = 65536
+
+    # Milliseconds between exit status checks of processes that closed their pipes but haven't exited
+    REAP_INTERVAL = 100
+
+    # Manager shared by every processor
+    shared_manager  = None
+    shared_lock     = threading.Lock()
+
+    def __init__(self):
+        super(ProcessManager, self).__init__()
+
+        self.poller = select.poll()
+
+        # Pipe written to wake the poll loop when processes are added
+        self.wake_read, self.wake_write = os.pipe()
+        self.poller.register(self.wake_read, select.POLLIN)
+
+        # Processes waiting to be registered with the poll loop
+        self.pending        = []
+        self.pending_lock   = threading.Lock()
+
+        # Set if the poll loop has died. Processes can't be watched by this manager anymore.
+        self.stopped        = False
+
+        # Open pipes (fd -> (future, stream name)), number of open pipes and output/stdin state of each process
+        # Stdin data is written from an offset so it's never copied
+        self.fds            = {}
+        self.open_pipes     = {}
+        self.outputs        = {}
+        self.stdin_data     = {}
+        self.stdin_offsets  = {}
+        self.log_files      = {}
+
+        # Processes whose pipes are closed that haven't exited yet
+        self.exiting        = []
+
+        # Usage statistics
+        self.num_processes  = 0
+        self.num_errors     = 0
+
+        # Run as a daemon so thread will quit upon error in main program
+        self.daemon = True
+
+    @staticmethod
+    def get_shared():
+        # Return the running process manager shared by every processor
+        with ProcessManager.shared_lock:
+            if ProcessManager.shared_manager is None or not ProcessManager.shared_manager.is_alive():
+                ProcessManager.shared_manager = ProcessManager()
+                ProcessManager.shared_manager.start()
+            return ProcessManager.shared_manager
+
+    def watch(self, process, stdin_data=None, output_limit=0, log_file=None):
+        # Start watching a process started with piped stdout/stderr (and stdin if stdin_data is given)
+        # Returns a future resolving to the process's (stdout, stderr) once it exits
+        # Output beyond output_limit bytes per stream is only kept in log_file
+        future = ProcessFuture(process)
+        with self.pending_lock:
+            if self.stopped:
+                raise RuntimeError("Process manager isn't running!")
+            self.pending.append((future, stdin_data, output_limit, log_file))
+        os.write(self.wake_write, "x")
+        return future
+
+    def run(self):
+        try:
+            self.__poll_loop()
+
+        except BaseException, e:
+            logging.error("(ProcessManager) Process manager stopped! Failing every process it was watching.")
+            if e.message != "":
+                logging.error("Received the following error: %s" % e.message)
+            self.__fail_all(e)
+
+    def __poll_loop(self):
+        while True:
+            timeout = self.REAP_INTERVAL if len(self.exiting) > 0 else None
+            try:
+                events = self.poller.poll(timeout)
+            except select.error, e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for fd, event in events:
+                if fd == self.wake_read:
+                    os.read(self.wake_read, self.READ_SIZE)
+                    self.__add_pending()
+                elif fd in self.fds:
+                    # Errors only stop the process the pipe belongs to from being watched
+                    future = self.fds[fd][0]
+                    try:
+                        self.__handle_event(fd, event)
+                    except BaseException, e:
+                        self.__fail(future, e)
+
+            self.__reap()
+
+    def __add_pending(self):
+        with self.pending_lock:
+            pending         = self.pending
+            self.pending    = []
+
+        for future, stdin_data, output_limit, log_file in pending:
+            try:
+                self.__add(future, stdin_data, output_limit, log_file)
+            except BaseException, e:
+                self.__fail(future, e)
+
+    def __add(self, future, stdin_data, output_limit, log_file):
+        process = future.process
+        self.num_processes += 1
+
+        # Stdout and stderr are both appended to the job's log file as they're received
+        log_fh = None
+        if log_file is not None:
+            try:
+                log_fh = open(log_file, "a")
+                self.log_files[future] = log_fh
+            except IOError, e:
+                logging.warning("(ProcessManager) Unable to open log file: %s" % log_file)
+                if e.strerror is not None:
+                    logging.warning("Received the following error: %s" % e.strerror)
+
+        self.outputs[future] = {"stdout": OutputCapture(limit=output_limit, log_fh=log_fh),
+                                "stderr": OutputCapture(limit=output_limit, log_fh=log_fh)}
+        self.open_pipes[future] = 0
+
+        for stream_name in ["stdout", "stderr"]:
+            stream = getattr(process, stream_name)
+            if stream is not None:
+                self.fds[stream.fileno()] = (future, stream_name)
+                self.open_pipes[future] += 1
+                self.poller.register(stream.fileno(), select.POLLIN | select.POLLPRI)
+
+        if process.stdin is not None:
+            if stdin_data:
+                self.stdin_data[future]     = stdin_data
+                self.stdin_offsets[future]  = 0
+                self.fds[process.stdin.fileno()] = (future, "stdin")
+                self.open_pipes[future] += 1
+                self.poller.register(process.stdin.fileno(), select.POLLOUT)
+            else:
+                process.stdin.close()
+
+        # Process may not have any pipes to watch
+        self.__check_pipes(future)
+
+    def __handle_event(self, fd, event):
+        future, stream_name = self.fds[fd]
+
+        if stream_name == "stdin":
+            # Write the next chunk of stdin. Chunks no bigger than PIPE_BUF never block once the pipe is writable.
+            data    = self.stdin_data[future]
+            offset  = self.stdin_offsets[future]
+            try:
+                if event & select.POLLOUT:
+                    offset += os.write(fd, buffer(data, offset, select.PIPE_BUF))
+                    self.stdin_offsets[future] = offset
+            except OSError, e:
+                # Process stopped reading its input
+                if e.errno != errno.EPIPE:
+                    raise
+                offset = len(data)
+
+            if offset >= len(data) or event & (select.POLLERR | select.POLLHUP | select.POLLNVAL):
+                self.__close(fd)
+                self.stdin_data.pop(future, None)
+                self.stdin_offsets.pop(future, None)
+            return
+
+        data = ""
+        if event & (select.POLLIN | select.POLLPRI | select.POLLHUP):
+            data = os.read(fd, self.READ_SIZE)
+
+        if len(data) > 0:
+            self.outputs[future][stream_name].write(data)
+        elif event & (select.POLLIN | select.POLLPRI | select.POLLHUP | select.POLLERR | select.POLLNVAL):
+            # End of stream
+            self.__close(fd)
+
+    def __close(self, fd):
+        future, stream_name = self.fds.pop(fd)
+        self.poller.unregister(fd)
+        getattr(future.process, stream_name).close()
+        self.open_pipes[future] -= 1
+        self.__check_pipes(future)
+
+    def __check_pipes(self, future):
+        # Once every pipe of a process is closed only its exit status is left to collect
+        if self.open_pipes[future] == 0:
+            self.open_pipes.pop(future)
+            self.exiting.append(future)
+
+    def __reap(self):
+        # Collect exit status of processes whose pipes are closed and resolve their futures
+        still_exiting = []
+        for future in self.exiting:
+            try:
+                if future.process.poll() is None:
+                    still_exiting.append(future)
+                    continue
+                error = None
+            except BaseException, e:
+                error = e
+
+            try:
+                if future in self.log_files:
+                    self.log_files.pop(future).close()
+            except BaseException, e:
+                error = e
+
+            output = self.outputs.pop(future)
+            future.set_result(output["stdout"].getvalue(), output["stderr"].getvalue(), error=error)
+        self.exiting = still_exiting
+
+    def __fail(self, future, error):
+        # Stop watching a process after an error and resolve its future with the error and any output received
+        logging.error("(ProcessManager) Unable to watch process!")
+        if str(error) != "":
+            logging.error("Received the following error: %s" % error)
+        self.num_errors += 1
+
+        for fd, (fd_future, stream_name) in self.fds.items():
+            if fd_future is future:
+                self.fds.pop(fd)
+                try:
+                    self.poller.unregister(fd)
+                    getattr(future.process, stream_name).close()
+                except BaseException:
+                    pass
+
+        self.open_pipes.pop(future, None)
+        self.stdin_data.pop(future, None)
+        self.stdin_offsets.pop(future, None)
+        if future in self.exiting:
+            self.exiting.remove(future)
+
+        try:
+            if future in self.log_files:
+                self.log_files.pop(future).close()
+        except BaseException:
+            pass
+
+        output = self.outputs.pop(future, None)
+        if output is None:
+            future.set_result(None, None, error=error)
+        else:
+            future.set_result(output["stdout"].getvalue(), output["stderr"].getvalue(), error=error)
+
+    def __fail_all(self, error):
+        # Resolve every outstanding future with an error once the poll loop has died
+        # New processes are watched by a new shared manager from now on
+        with ProcessManager.shared_lock:
+            if ProcessManager.shared_manager is self:
+                ProcessManager.shared_manager = None
+
+        with self.pending_lock:
+            self.stopped    = True
+            pending         = self.pending
+            self.pending    = []
+
+        futures = set([future for future, _, _, _ in pending] + [future for future, _ in self.fds.values()] +
+                      self.outputs.keys() + self.exiting)
+        for future in futures:
+            if not future.done():
+                self.__fail(future, error)
+
+    def __str__(self):
+        return "ProcessManager: %d processes watched, %d running, %d errors" % (self.num_processes, len(self.outputs), self.num_errors)
@@ -0,0 +1,32 @@
+class ProcessResult(object):
+    # Compact record of a finished process kept after its Popen object, pipes and output are released
+
+    # Characters of the command kept in the record
+    MAX_CMD_LENGTH = 200
+
+    def __init__(self, job_name, process):
+        self.job_name       = job_name
+        self.command        = process.get_command()[:self.MAX_CMD_LENGTH]
+        self.returncode     = process.returncode
+        self.num_retries    = process.get_num_retries()
+        self.start_time     = process.get_start_time()
+        self.end_time       = process.get_end_time()
+
+    def has_failed(self):
+        return self.returncode is not None and self.returncode != 0
+
+    def get_job_name(self):
+        return self.job_name
+
+    def get_returncode(self):
+        return self.returncode
+
+    def get_run_time(self):
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def __str__(self):
+        run_time = self.get_run_time()
+        run_time = "?" if run_time is None else "%.1fs" % run_time
+        return "%s: exit code %s after %s" % (self.job_name, self.returncode, run_time)
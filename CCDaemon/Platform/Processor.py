@@ -1,14 +1,25 @@
 import os
 import logging
 import abc
-from collections import OrderedDict
+from collections import OrderedDict, deque
 import subprocess as sp
 import threading
 
 from Process import Process
+from ProcessResult import ProcessResult
+from ProcessManager import ProcessManager
+from RetryPolicy import RetryPolicy
 
 class Processor(object):
     __metaclass__ = abc.ABCMeta
+
+    # Markers written to stdout and stderr around each step of a batch
+    STEP_BEGIN  = "__CC_DAEMON_STEP_BEGIN__"
+    STEP_END    = "__CC_DAEMON_STEP_END__"
+
+    # Exit code reported for steps of a batch that didn't run because a step they depend on failed
+    STEP_SKIPPED = -1
+
     def __init__(self, name, nr_cpus, mem, **kwargs):
         self.name       = name
         self.nr_cpus    = nr_cpus
@@ -17,9 +28,32 @@ class Processor(object):
         # Get name of directory where logs will be written
         self.log_dir    = kwargs.pop("log_dir", None)
 
-        # Ordered dictionary of processing being run by processor
+        # Local directory where the full output of each process is written as it's received
+        self.local_log_dir  = kwargs.pop("local_log_dir", None)
+
+        # Bytes of stdout and stderr kept in memory for each process. 0 keeps all output.
+        self.output_limit   = kwargs.pop("output_limit", 1048576)
+
+        if self.local_log_dir is not None and not os.path.exists(self.local_log_dir):
+            try:
+                os.makedirs(self.local_log_dir)
+            except OSError:
+                # Directory may have been created by another processor in the meantime
+                if not os.path.isdir(self.local_log_dir):
+                    raise
+
+        # Ordered dictionary of processes being run by processor that haven't been waited on yet
         self.processes  = OrderedDict()
 
+        # Compact records of the most recently finished processes
+        self.history    = deque(maxlen=kwargs.pop("max_history", 100))
+
+        # Names of the steps of each batch being run by processor
+        self.batches    = dict()
+
+        # Seconds each step of finished batches took to run (job_name -> step_name -> seconds)
+        self.batch_times = dict()
+
         # Boolean for whether processor is stopped
         self.locked = False
 
@@ -29,7 +63,7 @@ class Processor(object):
     def destroy(self):
         pass
 
-    def run(self, job_name, cmd, num_retries=2):
+    def run(self, job_name, cmd, num_retries=2, stdin_data=None, output_limit=None):
 
         # Throw error if attempting to run command on stopped processor
         if self.locked:
@@ -77,16 +111,201 @@ class Processor(object):
         kwargs["stdout"] = sp.PIPE
         kwargs["stderr"] = sp.PIPE
         kwargs["preexec_fn"] = os.setsid
+        kwargs["close_fds"] = True
         kwargs["num_retries"] = num_retries
 
+        # Only the head and tail of long output are kept in memory
+        if output_limit is None:
+            output_limit = self.output_limit
+        kwargs["output_limit"] = output_limit
+
+        # Data written to the process's stdin by the process manager
+        if stdin_data is not None:
+            kwargs["stdin"]         = sp.PIPE
+            kwargs["stdin_data"]    = stdin_data
+
         # Add process to list of processes
-        self.processes[job_name] = Process(cmd, **kwargs)
+        proc_obj = Process(cmd, **kwargs)
+        self.processes[job_name] = proc_obj
+
+        # Full output of the process is written to a local log file as it's received
+        local_log_file = None
+        if self.local_log_dir is not None:
+            local_log_file = os.path.join(self.local_log_dir, "%s.%s.log" % (self.name, job_name))
+
+        # Process manager drains output and collects exit status so no thread is blocked until it's waited on
+        proc_obj.set_future(ProcessManager.get_shared().watch(proc_obj,
+                                                              stdin_data=stdin_data,
+                                                              output_limit=output_limit,
+                                                              log_file=local_log_file))
+
+    def run_batch(self, job_name, steps, num_retries=2, stdin_data=None):
+        # Run a list of steps as a single process
+        # Steps are (step_name, cmd) pairs, which run after the step before them,
+        # or (step_name, cmd, dependencies) triples, which run as soon as the named earlier steps have succeeded
+        # Every step runs concurrently with the steps it doesn't depend on. Steps depending on a failed step don't run.
+        # Output, exit code and run time of each step are marked so wait_batch can report them separately
+        # Steps can read stdin_data from file descriptor 3 (e.g. 'tar -xf - <&3')
+        # wait_batch re-runs the whole batch up to num_retries times if a step fails, so every step must be idempotent
+        step_names  = []
+        step_deps   = []
+        for step in steps:
+            if len(step) == 3:
+                deps = step[2]
+            else:
+                deps = step_names[-1:]
+
+            # Dependencies must be declared before the step so steps are in an order they can run in
+            for dep in deps:
+                if dep not in step_names:
+                    logging.error("(%s) Step '%s' of batch '%s' depends on unknown step '%s'!" % (self.name, step[0], job_name, dep))
+                    raise RuntimeError("Step '%s' of batch '%s' depends on unknown step '%s'!" % (step[0], job_name, dep))
+
+            step_names.append(step[0])
+            step_deps.append([step_names.index(dep) for dep in deps])
+
+        # Output and result (exit code, milliseconds) of each step are kept in a temp directory until every step is done
+        script = ["exec 3<&0", "d=$(mktemp -d)"]
+
+        jobs = []
+        for i, step in enumerate(steps):
+            job = []
+
+            # Wait for dependencies and skip step unless they all succeeded
+            for dep in step_deps[i]:
+                job.append("while [ ! -f $d/%d.rc ] ; do sleep 0.1 ; done" % dep)
+                job.append("[ \"$(cut -d \" \" -f 1 $d/%d.rc)\" = 0 ] || { echo %d 0 >$d/%d.tmp ; mv $d/%d.tmp $d/%d.rc ; exit ; }" %
+                           (dep, self.STEP_SKIPPED, i, i, i))
+
+            job.append("s=$(date +%s%N)")
+            job.append("( %s ) >$d/%d.out 2>$d/%d.err" % (step[1], i, i))
+            job.append("rc=$?")
+            job.append("echo $rc $(( ($(date +%%s%%N) - s) / 1000000 )) >$d/%d.tmp" % i)
+            job.append("mv $d/%d.tmp $d/%d.rc" % (i, i))
+            jobs.append("( %s ) &" % " ; ".join(job))
+
+        script.append("%s wait" % " ".join(jobs))
+
+        # Report steps in the order they were declared. Skipped steps are reported without any output.
+        for i, step_name in enumerate(step_names):
+            script.append("read rc ms <$d/%d.rc" % i)
+            script.append("if [ $rc -ge 0 ] ; then "
+                          "echo %s %s ; cat $d/%d.out ; [ -z \"$(tail -c 1 $d/%d.out)\" ] || echo ; echo %s %s $rc $ms ; "
+                          "echo %s %s >&2 ; cat $d/%d.err >&2 ; [ -z \"$(tail -c 1 $d/%d.err)\" ] || echo >&2 ; echo %s %s $rc $ms >&2 ; "
+                          "else echo %s %s ; echo %s %s $rc 0 ; echo %s %s >&2 ; echo %s %s $rc 0 >&2 ; fi" %
+                          (self.STEP_BEGIN, step_name, i, i, self.STEP_END, step_name,
+                           self.STEP_BEGIN, step_name, i, i, self.STEP_END, step_name,
+                           self.STEP_BEGIN, step_name, self.STEP_END, step_name,
+                           self.STEP_BEGIN, step_name, self.STEP_END, step_name))
+
+        # Batch itself succeeds so failed steps aren't mistaken for failures to reach the processor
+        # Failed steps are retried by wait_batch
+        script.append("rm -rf $d")
+        script.append("exit 0")
+        script = " ; ".join(script)
+
+        # Output of batches is kept whole as step markers are needed to split it by step
+        self.batches[job_name] = (step_names, script, num_retries, stdin_data)
+        self.run(job_name, script, num_retries, stdin_data=stdin_data, output_limit=0)
+
+    def wait_batch(self, job_name):
+        # Wait for a batch to finish and return the results of its steps (step_name -> (exit_code, out, err))
+        # Batch is re-run if a step failed and retries are left. Raise an error naming the first step that failed otherwise.
+        attempt = 0
+        while True:
+            out, err                                    = self.wait_process(job_name)
+            step_names, script, num_retries, stdin_data = self.batches[job_name]
+            results, failed_step                        = self.__read_batch(job_name, step_names, out, err)
+
+            # Case: Every step succeeded
+            if failed_step is None:
+                break
+
+            # Report steps that didn't run because of the failure
+            skipped_steps = [step_name for step_name in results if results[step_name][0] == self.STEP_SKIPPED]
+            if len(skipped_steps) > 0:
+                logging.warning("(%s) Steps of batch '%s' skipped after step '%s' failed: %s" % (
+                    self.name, job_name, failed_step, ", ".join(skipped_steps)))
+
+            # Retry batch after a backoff delay if retries are left
+            exit_code, step_out, step_err = results.get(failed_step, (None, "", ""))
+            policy = RetryPolicy.for_error(step_err, exit_code)
+            logging.warning("(%s) Step '%s' of batch '%s' failed with exit code %s! %d retries left." % (
+                self.name, failed_step, job_name, exit_code, num_retries))
+            if not policy.retry(attempt, num_retries):
+                # Just throw an error otherwise
+                self.batches.pop(job_name)
+                if failed_step not in results:
+                    logging.error("(%s) Step '%s' of batch '%s' didn't finish!" % (self.name, failed_step, job_name))
+                    raise RuntimeError("Step '%s' of batch '%s' didn't finish!" % (failed_step, job_name))
+                logging.error("(%s) Step '%s' of batch '%s' failed!" % (self.name, failed_step, job_name))
+                logging.error("(%s) The following error was received: \n  %s\n%s" % (self.name, step_out, step_err))
+                raise RuntimeError("Step '%s' of batch '%s' failed!" % (failed_step, job_name))
+
+            # Re-run the whole batch
+            logging.warning("(%s) Re-running batch '%s'!" % (self.name, job_name))
+            self.batches[job_name] = (step_names, script, num_retries - 1, stdin_data)
+            self.run(job_name, script, num_retries - 1, stdin_data=stdin_data, output_limit=0)
+            attempt += 1
+
+        self.batches.pop(job_name)
+        logging.info("(%s) All %d steps of batch '%s' complete!" % (self.name, len(step_names), job_name))
+        return results
+
+    def __read_batch(self, job_name, step_names, out, err):
+        # Split output of a batch by step and record how long each step that ran took
+        # Returns results of the steps that finished or were skipped
+        # and the first step that failed or didn't finish (None if all succeeded)
+        step_out    = self.__split_steps(out)
+        step_err    = self.__split_steps(err)
+
+        step_times = OrderedDict()
+        for step_name in step_names:
+            if step_name in step_out and step_out[step_name][0] != self.STEP_SKIPPED:
+                step_times[step_name] = step_out[step_name][2]
+                logging.debug("(%s) Step '%s' of batch '%s' took %.1f seconds." % (self.name, step_name, job_name, step_times[step_name]))
+        self.batch_times[job_name] = step_times
+
+        results     = OrderedDict()
+        failed_step = None
+        for step_name in step_names:
+            # Step never finished if batch was interrupted
+            if step_name not in step_out:
+                failed_step = step_name if failed_step is None else failed_step
+                continue
+
+            exit_code, out_lines, _ = step_out[step_name]
+            _, err_lines, _         = step_err.get(step_name, (None, [], None))
+            results[step_name] = (exit_code, "\n".join(out_lines), "\n".join(err_lines))
+
+            if exit_code not in [0, self.STEP_SKIPPED] and failed_step is None:
+                failed_step = step_name
+
+        return results, failed_step
+
+    def get_batch_times(self, job_name):
+        # Return seconds each step of a finished batch took to run
+        return self.batch_times.get(job_name, OrderedDict())
+
+    def add_done_callback(self, job_name, callback):
+        # Call callback(future) once process has finished without waiting on it
+        self.processes[job_name].get_future().add_done_callback(callback)
 
     def wait(self):
         # Returns when all currently running processes have completed
-        for proc_name, proc_obj in self.processes.iteritems():
+        for proc_name in self.processes.keys():
             self.wait_process(proc_name)
 
+    def finish_process(self, job_name):
+        # Replace a process that has been waited on with a compact record so its pipes and output are released
+        proc_obj = self.processes.pop(job_name, None)
+        if proc_obj is not None:
+            self.history.append(ProcessResult(job_name, proc_obj))
+
+    def get_history(self):
+        # Return records of the most recently finished processes, oldest first
+        return list(self.history)
+
     def lock(self):
         # Prevent any additional processes from being run
         with threading.Lock():
@@ -102,17 +321,48 @@ class Processor(object):
         self.lock()
 
         # Kill all currently executing processes on processor
-        for proc_name, proc_obj in self.processes.iteritems():
+        for proc_name, proc_obj in self.processes.items():
             if not proc_obj.is_complete() and proc_name.lower() != "destroy":
                 logging.debug("Killing process: %s" % proc_name)
                 proc_obj.terminate()
 
+    def reset(self):
+        # Forget processes and logging of a previous platform so processor can be reused
+        self.processes  = OrderedDict()
+        self.history.clear()
+        self.batches    = dict()
+        self.batch_times = dict()
+        self.log_dir    = None
+        self.unlock()
+
+    def is_available(self):
+        # Return true if processor has been created and can run commands
+        return True
+
     def set_log_dir(self, new_log_dir):
         self.log_dir = new_log_dir
 
     def get_name(self):
         return self.name
 
+    @classmethod
+    def __split_steps(cls, output):
+        # Split output of a batch by step. Returns step_name -> (exit_code, lines, seconds) for steps that finished.
+        steps       = dict()
+        step_name   = None
+        step_lines  = []
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) == 2 and fields[0] == cls.STEP_BEGIN:
+                step_name   = fields[1]
+                step_lines  = []
+            elif len(fields) == 4 and fields[0] == cls.STEP_END and fields[1] == step_name:
+                steps[step_name] = (int(fields[2]), step_lines, int(fields[3]) / 1000.0)
+                step_name   = None
+            elif step_name is not None:
+                step_lines.append(line)
+        return steps
+
     @abc.abstractmethod
     def wait_process(self, proc_name):
         pass
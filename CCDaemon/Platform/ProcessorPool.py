@@ -0,0 +1,216 @@
+import logging
+import threading
+import time
+from collections import deque
+
+class ProcessorPool(threading.Thread):
+    # Keeps a number of created and scrubbed processors ready to be handed to platforms
+    # Saves the create and boot time of a processor each time a platform is launched
+
+    def __init__(self, name, processor_factory, wrk_dir, min_size=0, max_size=0, sleep_time=10):
+        super(ProcessorPool, self).__init__()
+
+        # Name of pool (e.g. machine shape of pooled processors)
+        self.name = name
+
+        # Function returning a new processor that hasn't been created yet
+        self.processor_factory = processor_factory
+
+        # Working directory removed from processors before they're reused
+        self.wrk_dir = wrk_dir
+
+        # Pool size adapts to the launch backlog between these bounds
+        self.min_size       = min_size
+        self.max_size       = max_size
+        self.target_size    = min_size
+
+        # Seconds between resizing the pool
+        self.sleep_time = sleep_time
+
+        # Processors ready to be acquired (oldest first), processors currently being created
+        # and number of creation threads still waiting on the processor factory
+        self.ready      = deque()
+        self.creating   = []
+        self.pending    = 0
+        self.threads    = []
+        self.pool_lock  = threading.Lock()
+
+        # Usage statistics
+        self.hits       = 0
+        self.misses     = 0
+        self.recycled   = 0
+        self.destroyed  = 0
+
+        # Stop variable
+        self.stopped = False
+
+        # Run as a daemon so thread will quit upon error in main program
+        self.daemon = True
+
+    def run(self):
+        while not self.is_stopped():
+            self.__resize()
+            time.sleep(self.sleep_time)
+
+    def acquire(self):
+        # Return a ready processor or None if the pool is empty
+        while True:
+            with self.pool_lock:
+                if self.stopped or len(self.ready) == 0:
+                    self.misses += 1
+                    return None
+                processor = self.ready.popleft()
+
+            # Make sure processor is still alive before handing it out
+            if self.__is_responsive(processor):
+                with self.pool_lock:
+                    self.hits += 1
+                logging.info("(%s) Acquired warm processor '%s'!" % (self.name, processor.get_name()))
+                return processor
+
+            self.__destroy(processor)
+
+    def release(self, processor):
+        # Return a processor to the pool or destroy it if the pool doesn't need it or it can't be scrubbed
+        with self.pool_lock:
+            keep = not self.stopped and len(self.ready) < self.target_size
+
+        if keep and processor.is_available() and self.__scrub(processor):
+            with self.pool_lock:
+                # Pool may have been stopped while processor was being scrubbed
+                if not self.stopped:
+                    self.ready.append(processor)
+                    self.recycled += 1
+                    logging.info("(%s) Recycled processor '%s'!" % (self.name, processor.get_name()))
+                    return
+
+        self.__destroy(processor)
+
+    def set_backlog(self, backlog):
+        # Adapt the number of ready processors to the number of pipelines waiting to be launched
+        with self.pool_lock:
+            target_size = min(max(backlog, self.min_size), self.max_size)
+            if target_size != self.target_size:
+                logging.debug("(%s) Changing warm pool size from %d to %d!" % (self.name, self.target_size, target_size))
+                self.target_size = target_size
+
+    def stop(self):
+        # Stop pool and destroy every processor it's holding
+        with self.pool_lock:
+            self.stopped    = True
+            ready           = list(self.ready)
+            creating        = list(self.creating)
+            threads         = list(self.threads)
+            self.ready.clear()
+
+        # Interrupt processors still being created. They're destroyed by their creating threads.
+        for processor in creating:
+            processor.stop()
+
+        for processor in ready:
+            self.__destroy(processor)
+
+        for thread in threads:
+            thread.join()
+
+    def is_stopped(self):
+        with self.pool_lock:
+            return self.stopped
+
+    def __resize(self):
+        # Create or destroy processors until the pool reaches its target size
+        with self.pool_lock:
+            num_missing = self.target_size - len(self.ready) - len(self.creating) - self.pending
+            excess      = [self.ready.popleft() for _ in range(len(self.ready) - self.target_size)]
+
+            # Forget about threads that have finished creating their processor
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+
+            for _ in range(num_missing):
+                thread = threading.Thread(target=self.__add_processor)
+                thread.daemon = True
+                self.threads.append(thread)
+                self.pending += 1
+                thread.start()
+
+        for processor in excess:
+            self.__destroy(processor)
+
+    def __add_processor(self):
+        # Create a new processor and add it to the pool
+        processor = None
+        try:
+            processor = self.processor_factory()
+            with self.pool_lock:
+                self.pending -= 1
+                if self.stopped:
+                    return
+                self.creating.append(processor)
+
+            processor.create()
+
+            with self.pool_lock:
+                self.creating.remove(processor)
+                if not self.stopped:
+                    self.ready.append(processor)
+                    logging.info("(%s) Warm processor '%s' is ready!" % (self.name, processor.get_name()))
+                    return
+
+        except BaseException, e:
+            logging.error("(%s) Unable to create warm processor!" % self.name)
+            if e.message != "":
+                logging.error("Received the following error: %s" % e.message)
+            with self.pool_lock:
+                if processor is None:
+                    self.pending -= 1
+                elif processor in self.creating:
+                    self.creating.remove(processor)
+
+        # Destroy processors that failed or finished after the pool was stopped
+        if processor is not None:
+            self.__destroy(processor)
+
+    def __scrub(self, processor):
+        # Remove everything left behind by the previous pipeline
+        try:
+            processor.reset()
+            cmd = "sudo pkill -9 -f '[C]loudConductor/CloudConductor' ; sudo rm -rf %s" % self.wrk_dir
+            processor.run("scrub", cmd, num_retries=0)
+            processor.wait_process("scrub")
+            processor.reset()
+            return True
+        except BaseException, e:
+            logging.warning("(%s) Unable to scrub processor '%s'!" % (self.name, processor.get_name()))
+            if e.message != "":
+                logging.warning("Received the following error: %s" % e.message)
+            return False
+
+    def __is_responsive(self, processor):
+        # Check that a pooled processor can still run commands
+        if not processor.is_available():
+            logging.warning("(%s) Warm processor '%s' is no longer available!" % (self.name, processor.get_name()))
+            return False
+        try:
+            processor.run("pool_check", "true", num_retries=0)
+            processor.wait_process("pool_check")
+            processor.reset()
+            return True
+        except BaseException:
+            logging.warning("(%s) Warm processor '%s' is no longer responsive!" % (self.name, processor.get_name()))
+            return False
+
+    def __destroy(self, processor):
+        try:
+            processor.destroy()
+            with self.pool_lock:
+                self.destroyed += 1
+        except BaseException, e:
+            logging.warning("(%s) Could not destroy processor '%s'!" % (self.name, processor.get_name()))
+            if e.message != "":
+                logging.warning("Received the following error: %s" % e.message)
+
+    def __str__(self):
+        with self.pool_lock:
+            return "%s: %d ready, %d creating, target %d (min: %d, max: %d), %d hits, %d misses, %d recycled, %d destroyed" % \
+                   (self.name, len(self.ready), len(self.creating) + self.pending, self.target_size, self.min_size, self.max_size,
+                    self.hits, self.misses, self.recycled, self.destroyed)
@@ -0,0 +1,131 @@
+import logging
+import random
+import threading
+import time
+
+class RetryPolicy(object):
+    # How long to wait before retrying a failed call and whether it can be retried at all
+    # Delays grow exponentially with full jitter so threads failing together don't retry together
+    # Each policy has a budget of retries per minute shared by every thread so a failing service isn't flooded
+
+    # Classes of errors with their own policies
+    CONNECTION  = "connection"  # Instance couldn't be reached (e.g. ssh exit code 255)
+    THROTTLED   = "throttled"   # Service is rate limiting requests or quota was exceeded
+    TRANSIENT   = "transient"   # Other errors of cloud services that may go away on their own
+    COMMAND     = "command"     # Command ran but failed
+
+    # Error messages that indicate requests are being throttled
+    THROTTLE_MESSAGES = ["429", "rate limit", "ratelimitexceeded", "quota", "too many requests", "resource_exhausted"]
+
+    # Policies of each error class
+    policies        = {}
+    policies_lock   = threading.Lock()
+
+    def __init__(self, error_class, base_delay=1, max_delay=60, budget=300):
+        self.error_class = error_class
+
+        # Upper bound on delay before first retry, doubling with each retry up to max_delay
+        self.base_delay     = base_delay
+        self.max_delay      = max_delay
+
+        # Maximum number of retries per minute. Budget refills continuously.
+        self.budget         = budget
+        self.tokens         = float(budget)
+        self.refill_time    = time.time()
+
+        # Retry counters
+        self.num_retries    = 0
+        self.num_denied     = 0
+        self.num_exhausted  = 0
+        self.total_delay    = 0.0
+
+        self.policy_lock    = threading.Lock()
+
+    @staticmethod
+    def configure(budget=300, max_delay=120):
+        # Create policies of every error class or update limits of existing policies, keeping their counters
+        with RetryPolicy.policies_lock:
+            if len(RetryPolicy.policies) == 0:
+                RetryPolicy.policies = {
+                    RetryPolicy.CONNECTION: RetryPolicy(RetryPolicy.CONNECTION, base_delay=2),
+                    RetryPolicy.THROTTLED:  RetryPolicy(RetryPolicy.THROTTLED,  base_delay=10),
+                    RetryPolicy.TRANSIENT:  RetryPolicy(RetryPolicy.TRANSIENT,  base_delay=1),
+                    RetryPolicy.COMMAND:    RetryPolicy(RetryPolicy.COMMAND,    base_delay=5)}
+
+            for policy in RetryPolicy.policies.itervalues():
+                policy.set_limits(budget, max_delay)
+
+    def set_limits(self, budget, max_delay):
+        with self.policy_lock:
+            self.tokens     = min(self.tokens, float(budget))
+            self.budget     = budget
+            self.max_delay  = max_delay
+
+    @staticmethod
+    def get(error_class):
+        # Return policy of an error class
+        with RetryPolicy.policies_lock:
+            return RetryPolicy.policies[error_class]
+
+    @staticmethod
+    def get_policies():
+        with RetryPolicy.policies_lock:
+            return RetryPolicy.policies.values()
+
+    @staticmethod
+    def classify(err_msg="", returncode=None, default=None):
+        # Return error class of a failed command or request
+        err_msg = "" if err_msg is None else err_msg.lower()
+        if any([msg in err_msg for msg in RetryPolicy.THROTTLE_MESSAGES]):
+            return RetryPolicy.THROTTLED
+        if returncode == 255:
+            return RetryPolicy.CONNECTION
+        return RetryPolicy.COMMAND if default is None else default
+
+    @staticmethod
+    def for_error(err_msg="", returncode=None, default=None):
+        # Return policy of a failed command or request
+        return RetryPolicy.get(RetryPolicy.classify(err_msg, returncode, default))
+
+    def retry(self, attempt, retries_left):
+        # Sleep before retry number 'attempt' (starting at 0) and return True,
+        # or return False without sleeping if no retries are left or the budget is spent
+        if retries_left <= 0:
+            with self.policy_lock:
+                self.num_exhausted += 1
+            return False
+
+        if not self.__take_token():
+            logging.warning("(RetryPolicy) Retry budget of '%s' errors spent! Not retrying." % self.error_class)
+            return False
+
+        delay = self.get_delay(attempt)
+        with self.policy_lock:
+            self.num_retries += 1
+            self.total_delay += delay
+        time.sleep(delay)
+        return True
+
+    def get_delay(self, attempt):
+        # Full jitter: random delay between 0 and the exponential backoff cap
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def __take_token(self):
+        with self.policy_lock:
+            now                 = time.time()
+            self.tokens         = min(float(self.budget), self.tokens + (now - self.refill_time) * self.budget / 60.0)
+            self.refill_time    = now
+            if self.tokens < 1:
+                self.num_denied += 1
+                return False
+            self.tokens -= 1
+            return True
+
+    def __str__(self):
+        with self.policy_lock:
+            return "RetryPolicy '%s': %d retries (%.1fs total delay), %d denied by budget, %d gave up" % \
+                   (self.error_class, self.num_retries, self.total_delay, self.num_denied, self.num_exhausted)
+
+
+# Default policies until platform config is read
+RetryPolicy.configure()
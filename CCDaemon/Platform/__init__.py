@@ -1,4 +1,8 @@
+from RetryPolicy import RetryPolicy
 from Process import Process
+from ProcessResult import ProcessResult
+from ProcessManager import ProcessManager, ProcessFuture
 from Processor import Processor
+from ProcessorPool import ProcessorPool
 from Platform import Platform
 
@@ -1,7 +1,9 @@
 import logging
+import threading
 from copy import deepcopy
 
 from Config import Validatable
+from CCDaemon.Platform import ProcessorPool
 
 class PlatformFactory(Validatable):
 
@@ -13,6 +15,13 @@ class PlatformFactory(Validatable):
         # Class of platform that will be produced
         self.platform_class = platform_class
 
+        # Warm processor pools for each machine shape (nr_cpus, mem)
+        self.processor_pools    = {}
+        self.pool_lock          = threading.Lock()
+
+        # Whether platform config enables warm pools. Unknown until first platform config is validated.
+        self.pooling_enabled    = None
+
     def is_valid(self):
         logging.info("Validating Platform factory by creating TestPlatform...")
         test_platform = self.get_platform(name="TestPlatform")
@@ -21,7 +30,55 @@ class PlatformFactory(Validatable):
     def define_config_schema(self):
         return None
 
-    def get_platform(self, name, **kwargs):
+    def get_platform(self, name, warm_pool=False, **kwargs):
         config_copy = deepcopy(self.config)
-        return self.platform_class(name=name, config=config_copy, **kwargs)
+        platform = self.platform_class(name=name, config=config_copy, **kwargs)
+
+        # Give platform access to warm processors of its machine shape
+        if warm_pool:
+            platform.set_processor_pool(self.get_processor_pool(platform))
+
+        return platform
+
+    def get_processor_pool(self, platform):
+        # Return the warm processor pool for a platform's machine shape or None if pools are disabled
+        with self.pool_lock:
+            self.pooling_enabled = platform.warm_pool_max > 0
+            if not self.pooling_enabled:
+                return None
+
+            shape = (platform.nr_cpus, platform.mem)
+            if shape not in self.processor_pools:
+                logging.info("(PlatformFactory) Starting warm pool for %d CPU, %d GB processors..." % shape)
+                pool = ProcessorPool(name="ProcessorPool-%dCPU-%dGB" % shape,
+                                     processor_factory=self.__create_pool_processor,
+                                     wrk_dir=platform.wrk_dir,
+                                     min_size=platform.warm_pool_min,
+                                     max_size=platform.warm_pool_max)
+                pool.start()
+                self.processor_pools[shape] = pool
+
+            return self.processor_pools[shape]
+
+    def get_processor_pools(self):
+        with self.pool_lock:
+            return self.processor_pools.values()
+
+    def set_backlog(self, backlog):
+        # Adapt size of warm pools to the number of pipelines waiting to be launched
+        if self.pooling_enabled is None:
+            # Start pool for the configured machine shape the first time a backlog is reported
+            self.get_processor_pool(self.get_platform(name="WarmPool"))
+
+        for pool in self.get_processor_pools():
+            pool.set_backlog(backlog)
+
+    def stop_processor_pools(self):
+        # Stop warm pools and destroy any processors they're holding
+        for pool in self.get_processor_pools():
+            pool.stop()
 
+    def __create_pool_processor(self):
+        # Return a new, uncreated processor with a unique name for a warm pool
+        platform = self.get_platform(name="pool-%s" % self.platform_class.generate_unique_id())
+        return platform.init_processor()
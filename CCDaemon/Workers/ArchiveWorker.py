@@ -0,0 +1,32 @@
+import logging
+
+from CCDaemon.Workers import StatusWorker
+
+class ArchiveWorker(StatusWorker):
+    # Main class for periodically moving old finished pipelines out of the active analysis tables
+    def __init__(self, db_helper, pipeline_queue, sleep_time=3600):
+        super(ArchiveWorker, self).__init__(db_helper, pipeline_queue, sleep_time)
+
+    def task(self, session):
+
+        num_archived = 0
+
+        try:
+            # Archive pipelines in batches so each transaction stays small
+            while not self.is_stopped():
+                pipeline_ids = self.db_helper.archive_pipelines(session)
+                session.commit()
+                num_archived += len(pipeline_ids)
+
+                if len(pipeline_ids) < self.db_helper.archiver.batch_size:
+                    break
+
+        except BaseException, e:
+            # Archiving is housekeeping so don't bring down the daemon if a batch fails
+            session.rollback()
+            logging.error("(ArchiveWorker) Unable to archive finished pipelines!")
+            if e.message != "":
+                logging.error("Received the following error message: %s" % e.message)
+
+        if num_archived > 0:
+            logging.info("(ArchiveWorker) Archived %d finished pipelines!" % num_archived)
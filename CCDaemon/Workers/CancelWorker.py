@@ -0,0 +1,36 @@
+import logging
+
+from CCDaemon.Workers import StatusWorker
+
+class CancelWorker(StatusWorker):
+    # Main class for cancelling running pipelines as soon as cancellation is signalled from the database
+    def __init__(self, db_helper, pipeline_queue, sleep_time=1):
+        super(CancelWorker, self).__init__(db_helper, pipeline_queue, sleep_time)
+
+        # Id of the most recent cancellation signal processed
+        self.last_signal_id = None
+
+    def task(self, session):
+
+        # Ignore signals raised before the daemon started. Orphaned pipelines are failed at startup.
+        if self.last_signal_id is None:
+            self.last_signal_id = self.db_helper.get_last_cancel_signal_id(session)
+            return
+
+        # Get any cancellation signals raised since the last check
+        signals = self.db_helper.get_cancel_signals(session, min_signal_id=self.last_signal_id)
+
+        if len(signals) == 0:
+            return
+
+        active_pipelines = self.pipeline_queue.get_pipelines().values()
+
+        for signal in signals:
+            self.last_signal_id = max(self.last_signal_id, signal.signal_id)
+
+            for active_pipeline in active_pipelines:
+                # Cancel pipelines matching signal by id or analysis type
+                if (signal.analysis_id is not None and active_pipeline.get_id() == signal.analysis_id) or \
+                        (signal.analysis_type_id is not None and active_pipeline.get_analysis_type_id() == signal.analysis_type_id):
+                    logging.error("(CancelWorker) Pipeline '%s' has been cancelled from the database by the user!" % active_pipeline.get_id())
+                    active_pipeline.cancel()
@@ -3,50 +3,92 @@ from datetime import datetime
 
 from CCDaemon.Workers import StatusWorker, PipelineRunner
 from CCDaemon.Pipeline import PipelineStatus, PipelineError
+from CCDaemon.Database import DBError
 
 class LaunchWorker(StatusWorker):
     # Main class for loading idle pipelines from database
-    def __init__(self, db_helper, pipeline_queue, platform_factory, sleep_time=2):
+    def __init__(self, db_helper, pipeline_queue, platform_factory, sleep_time=2, full_sync_interval=30):
         super(LaunchWorker, self).__init__(db_helper, pipeline_queue, sleep_time)
 
         # Factory for creating new pipeline runners
         self.platform_factory = platform_factory
 
+        # IDLE pipelines that are candidates for launching (analysis_id -> cpus)
+        self.idle_candidates = {}
+
+        # Highest pipeline id seen by IDLE pipeline discovery
+        self.idle_watermark = None
+
+        # Number of tasks between full re-syncs of IDLE candidates
+        # Catches pipelines that were reset to IDLE after the watermark passed them
+        self.full_sync_interval = full_sync_interval
+        self.tasks_since_sync   = full_sync_interval
+
     def task(self, session):
 
-        # Get list of analysis pipelines that are ready to run
-        idle_pipelines = self.db_helper.get_pipeline(session, status=PipelineStatus.IDLE)
+        # Give freed resources to pipelines that were launched ahead of time
+        admitted_ids = self.pipeline_queue.admit_staged()
+        if len(admitted_ids) > 0:
+            logging.info("Admitted staged pipelines: %s" % ", ".join([str(x) for x in admitted_ids]))
+
+        # Update list of analysis pipelines that are ready to run
+        self.sync_idle_candidates()
+
+        # Size warm processor pools to the number of pipelines waiting to be launched
+        self.platform_factory.set_backlog(len(self.idle_candidates))
 
-        for pipeline in idle_pipelines:
+        for pipeline_id in sorted(self.idle_candidates.keys()):
 
             # Check to see if worker has been stopped externally
             if self.is_stopped():
                 return
 
-            # Check to see whether pipeline can be run
-            if not self.__can_load_pipeline(pipeline):
+            # Check to see whether pipeline can be run now or launched ahead of time
+            staged = False
+            if not self.__can_load_pipeline(pipeline_id, self.idle_candidates[pipeline_id]):
+                if not self.__can_stage_pipeline(pipeline_id, self.idle_candidates[pipeline_id]):
+                    continue
+                staged = True
+
+            # Load snapshot of pipeline record and make sure it's still waiting to be run
+            try:
+                pipeline = self.db_helper.get_pipeline_snapshot(session, pipeline_id=pipeline_id)
+            except DBError:
+                logging.debug("Dropping launch candidate no longer in database: %s" % pipeline_id)
+                self.idle_candidates.pop(pipeline_id)
+                continue
+
+            if pipeline.status_id != self.db_helper.statuses[PipelineStatus.IDLE]:
+                logging.debug("Dropping launch candidate no longer IDLE: %s" % pipeline_id)
+                self.idle_candidates.pop(pipeline_id)
                 continue
 
             try:
 
-                logging.info("Preparing to launch pipeline: '%s'!" % pipeline.name)
+                if staged:
+                    logging.info("Preparing to launch pipeline ahead of time: '%s'!" % pipeline.name)
+                else:
+                    logging.info("Preparing to launch pipeline: '%s'!" % pipeline.name)
 
                 # Get PipelineWorker for running pipeline
-                platform            = self.platform_factory.get_platform(name=str(pipeline.analysis_id))
-                config_file_strings = self.db_helper.get_config_file_strings(pipeline)
-                pipeline_worker     = PipelineRunner(pipeline, config_file_strings, platform)
+                platform            = self.platform_factory.get_platform(name=str(pipeline.analysis_id), warm_pool=True)
+                config_file_strings = self.db_helper.get_config_file_strings(session, pipeline)
+                pipeline_worker     = PipelineRunner(pipeline, config_file_strings, platform, admitted=not staged)
 
-                # Set status in DB to loading and commit the latest change
-                self.db_helper.update_status(pipeline, status=PipelineStatus.READY)
+                # Set status in DB to loading
+                self.db_helper.buffer_status(pipeline_id, status=PipelineStatus.READY)
 
                 # Begin running the pipeline
                 pipeline_worker.start()
 
                 # Set run start time variable in database
-                pipeline.run_start = datetime.now()
+                self.db_helper.buffer_update(pipeline_id, run_start=datetime.now())
 
                 # Enqueue pipeline worker into pipeline queue
-                self.pipeline_queue.add_pipeline(pipeline_worker)
+                self.pipeline_queue.add_pipeline(pipeline_worker, staged=staged)
+
+                # Pipeline is no longer a launch candidate
+                self.idle_candidates.pop(pipeline_id)
 
             except BaseException, e:
 
@@ -56,30 +98,63 @@ class LaunchWorker(StatusWorker):
                     logging.error("Received the following error: %s" % e.message)
 
                 # Record pipeline failure in DB
-                self.db_helper.update_status(pipeline, status=PipelineStatus.FAILED)
+                self.db_helper.buffer_status(pipeline_id, status=PipelineStatus.FAILED)
 
                 # Specify pipeline failure due to init error
-                self.db_helper.update_error_type(pipeline, error_type=PipelineError.INIT, extra_error_msg=e.message)
+                self.db_helper.buffer_error_type(pipeline_id, error_type=PipelineError.INIT, extra_error_msg=e.message)
+
+                # Write failure immediately because the worker is about to stop
+                self.db_helper.flush_updates()
 
                 # Raise offending error because this shouldn't be happening
                 raise
 
-            finally:
-                # Commit any database changes for pipelines
-                session.commit()
-
-    def __can_load_pipeline(self, pipeline):
+    def sync_idle_candidates(self):
+        # Update the set of IDLE launch candidates from the database
+
+        # Polling is read-only so it can be served by a replica
+        # Candidates are re-checked against the primary database before they're launched
+        with self.db_helper.session_context(read_only=True) as read_session:
+
+            if self.tasks_since_sync >= self.full_sync_interval:
+                # Periodically reload every IDLE pipeline to drop stale candidates and catch status resets
+                idle_pipelines = self.db_helper.get_idle_pipelines(read_session)
+                self.idle_candidates = {}
+                self.tasks_since_sync = 0
+            else:
+                # Otherwise only fetch IDLE pipelines added since the last time we looked
+                idle_pipelines = self.db_helper.get_idle_pipelines(read_session, min_id=self.idle_watermark)
+                self.tasks_since_sync += 1
+
+        for pipeline_row in idle_pipelines:
+            self.idle_candidates[pipeline_row.analysis_id] = pipeline_row.cpus
+            if self.idle_watermark is None or pipeline_row.analysis_id > self.idle_watermark:
+                self.idle_watermark = pipeline_row.analysis_id
+
+    def __can_load_pipeline(self, pipeline_id, cpus):
         # Return true if pipeline can be loaded, false otherwise
 
         # Determine if pipeline queue meet pipeline resource requirements
-        cpus        = pipeline.analysis_type.cpus
         if not self.pipeline_queue.can_add_pipeline(req_cpus=cpus):
-            logging.debug("Unable to run pipeline due to CPU or loading limit: %s" % pipeline.analysis_id)
+            logging.debug("Unable to run pipeline due to CPU or loading limit: %s" % pipeline_id)
+            return False
+
+        # Determine if pipeline is currently running
+        if self.pipeline_queue.contains_pipeline(pipeline_id=pipeline_id):
+            logging.debug("Unable to run pipeline due duplicate pipeline in queue: %s" % pipeline_id)
+            return False
+
+        return True
+
+    def __can_stage_pipeline(self, pipeline_id, cpus):
+        # Return true if pipeline should be launched before resources are available to run it
+
+        # Determine if running pipelines are expected to free up resources before platform finishes launching
+        if not self.pipeline_queue.can_stage_pipeline(req_cpus=cpus):
             return False
 
         # Determine if pipeline is currently running
-        if self.pipeline_queue.contains_pipeline(pipeline_id=pipeline.analysis_id):
-            logging.debug("Unable to run pipeline due duplicate pipeline in queue: %s" % pipeline.analysis_id)
+        if self.pipeline_queue.contains_pipeline(pipeline_id=pipeline_id):
             return False
 
         return True
@@ -7,10 +7,10 @@ from CCDaemon.Pipeline import PipelineError, PipelineStatus
 
 class PipelineRunner(threading.Thread):
 
-    def __init__(self, pipeline, config_file_strings, platform):
+    def __init__(self, pipeline, config_file_strings, platform, admitted=True):
         super(PipelineRunner, self).__init__()
 
-        # Get data from pipeline DB record
+        # Get data from PipelineSnapshot of pipeline DB record
         self.id     = pipeline.analysis_id
         self.name   = pipeline.name
         self.cc_version = pipeline.git_commit
@@ -24,14 +24,26 @@ class PipelineRunner(threading.Thread):
         self.config_file_strings = config_file_strings
 
         # Initialize resource requirement variables
-        self.cpus       = pipeline.analysis_type.cpus
+        self.cpus       = pipeline.cpus
+
+        # Analysis type of pipeline so pipelines can be cancelled by type
+        self.analysis_type_id = pipeline.analysis_type_id
 
         # Initialize running time variables
-        self.max_run_time   = pipeline.analysis_type.max_run_time
+        self.max_run_time   = pipeline.max_run_time
         self.create_time    = datetime.now()
         self.start_time     = None
         self.end_time       = None
 
+        # Number of seconds it took to launch the platform
+        self.launch_time    = None
+
+        # Pipelines launched speculatively don't run CC until they're admitted to the pipeline queue
+        self.admission              = threading.Event()
+        self.awaiting_admission     = False
+        if admitted:
+            self.admission.set()
+
         # PipelineRunner status variable
         self.status         = PipelineStatus.READY
         self.status_lock    = threading.Lock()
@@ -47,8 +59,9 @@ class PipelineRunner(threading.Thread):
     def run(self):
         # Load pipeline platform and run pipeline using GAP
 
-        # Set run start time
-        self.set_start_time()
+        # Set run start time. Pipelines launched ahead of time start their clock once they're admitted.
+        if self.admission.is_set():
+            self.set_start_time()
 
         try:
 
@@ -58,7 +71,9 @@ class PipelineRunner(threading.Thread):
 
             # Launch new platform and load all resources necessary to run GAP
             self.set_status(PipelineStatus.LOADING)
+            launch_start = datetime.now()
             self.platform.launch(cc_config_files=self.config_file_strings, commit_id=self.cc_version)
+            self.launch_time = (datetime.now() - launch_start).total_seconds()
 
             # Exit run if pipeline cancelled by user
             if self.get_status() == PipelineStatus.CANCELLING:
@@ -68,6 +83,13 @@ class PipelineRunner(threading.Thread):
             if self.cc_version is None:
                 self.cc_version = self.platform.get_cc_version()
 
+            # Wait for resources if platform was launched speculatively
+            self.wait_for_admission()
+
+            # Exit run if pipeline cancelled by user
+            if self.get_status() == PipelineStatus.CANCELLING:
+                raise
+
             # Run CloudConductor
             self.set_status(PipelineStatus.RUNNING)
             self.platform.run_cc()
@@ -123,6 +145,9 @@ class PipelineRunner(threading.Thread):
         self.set_status(PipelineStatus.CANCELLING)
         self.err_type = PipelineError.CANCEL
 
+        # Stop waiting for admission so pipeline can be finalized
+        self.admission.set()
+
         if curr_status == PipelineStatus.RUNNING:
             # Gracefully kill GAP if currently running
             self.platform.cancel_cc()
@@ -131,6 +156,26 @@ class PipelineRunner(threading.Thread):
             # Gracefully stop platform if loading
             self.platform.cancel_launch()
 
+    def wait_for_admission(self):
+        # Block until pipeline has been given resources in the pipeline queue
+        if self.admission.is_set():
+            return
+
+        logging.info("(PipelineRunner %s) Platform launched ahead of time! Waiting for resources to free up..." % self.id)
+        with self.status_lock:
+            self.awaiting_admission = True
+
+        self.admission.wait()
+
+        with self.status_lock:
+            self.awaiting_admission = False
+
+    def admit(self):
+        # Allow pipeline to run CC
+        logging.info("(PipelineRunner %s) Pipeline admitted to pipeline queue!" % self.id)
+        self.set_start_time()
+        self.admission.set()
+
     def finalize(self):
 
         # Do nothing if PipelineRunner is in the process of destroying itself or is already destroyed
@@ -189,5 +234,18 @@ class PipelineRunner(threading.Thread):
     def get_cpus(self):
         return self.cpus
 
+    def get_max_run_time(self):
+        return self.max_run_time
+
+    def get_launch_time(self):
+        return self.launch_time
+
+    def is_awaiting_admission(self):
+        with self.status_lock:
+            return self.awaiting_admission
+
+    def get_analysis_type_id(self):
+        return self.analysis_type_id
+
     def get_cc_version(self):
         return self.cc_version
\ No newline at end of file
@@ -36,6 +36,9 @@ class ReportWorker(StatusWorker):
                 logging.debug("(ReportWorker) Not adding pipeline report to database because pipeline still present in pipeline queue!")
                 return
 
+            # Write any buffered RunWorker updates so they can't overwrite the report results
+            self.db_helper.flush_updates()
+
             # Check to see if pipeline is actually in database
             if not self.db_helper.pipeline_exists(session, pipeline_id=report.get_pipeline_id()):
                 logging.debug("(ReportWorker) Not adding pipeline report to database because pipeline id doesn't appear in database")
@@ -80,35 +83,29 @@ class ReportWorker(StatusWorker):
             pipeline.git_commit = git_commit
 
         # Add output file information regardless of whether pipeline was successful
-        qc_entries_seen = []
-        for report_file in report.get_files():
-            if report_file.is_found():
-                self.db_helper.register_output_file(pipeline, report_file)
+        found_files = [report_file for report_file in report.get_files() if report_file.is_found()]
+        num_added   = self.db_helper.register_output_files(session, pipeline, found_files)
+        logging.debug("(ReportWorker) Added %d output files to database for pipeline: %s" % (num_added, pipeline.analysis_id))
 
-                # Parse file if qc_report
-                if report_file.get_filetype() == "qc_report":
-
-                    try:
-                        # Try to Parse QCFile
-                        qc_stats = self.parse_qc_report(report_file.get_path())
+        qc_stats = []
+        for report_file in found_files:
 
-                        # Add stats parsed from qc file if not already there
-                        for qc_stat in qc_stats:
-                            stat_id = "{0}_{1}_{2}_{3}".format(qc_stat.get_sample_id(),
-                                                                   qc_stat.get_key(),
-                                                                   qc_stat.get_task_id(),
-                                                                   qc_stat.get_input_file())
+            # Parse file if qc_report
+            if report_file.get_filetype() == "qc_report":
 
-                            # Add to database if not already seen
-                            if stat_id not in qc_entries_seen:
-                                self.db_helper.register_qc_stat(pipeline, qc_stat)
-                                qc_entries_seen.append(stat_id)
+                try:
+                    # Try to Parse QCFile and collect stats for bulk insertion
+                    qc_stats.extend(self.parse_qc_report(report_file.get_path()))
 
-                    except BaseException, e:
-                        logging.warning("Unable to add qc stats to database for file: {0}".format(report_file.get_path()))
-                        if e.message != "":
-                            logging.warning("Received the following error:\n{0}".format(e.message))
+                except BaseException, e:
+                    logging.warning("Unable to add qc stats to database for file: {0}".format(report_file.get_path()))
+                    if e.message != "":
+                        logging.warning("Received the following error:\n{0}".format(e.message))
 
+        # Bulk insert stats parsed from qc files if not already there
+        if len(qc_stats) > 0:
+            num_added = self.db_helper.register_qc_stats(session, pipeline, qc_stats)
+            logging.debug("(ReportWorker) Added %d qc stats to database for pipeline: %s" % (num_added, pipeline.analysis_id))
 
         # Update pipeline status and error type
         if report.is_successful():
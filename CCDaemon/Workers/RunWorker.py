@@ -3,6 +3,7 @@ from datetime import datetime
 
 from CCDaemon.Workers import StatusWorker
 from CCDaemon.Pipeline import PipelineStatus, PipelineError
+from CCDaemon.Database import DBError
 
 class RunWorker(StatusWorker):
     # Main class for loading idle pipelines from database
@@ -14,10 +15,16 @@ class RunWorker(StatusWorker):
         # Get list of currently active pipelines
         active_pipelines = self.pipeline_queue.get_pipelines().values()
 
+        # Get database records of all active pipelines in one query
+        pipeline_ids    = [active_pipeline.get_id() for active_pipeline in active_pipelines]
+        db_pipelines    = dict([(row.analysis_id, row) for row in self.db_helper.get_pipeline_rows(session, pipeline_ids)])
+
         for active_pipeline in active_pipelines:
 
             # Get pipeline record from database
-            db_pipeline = self.db_helper.get_pipeline(session, pipeline_id=active_pipeline.get_id())
+            if active_pipeline.get_id() not in db_pipelines:
+                raise DBError("No pipelines found with id: '%s'" % active_pipeline.get_id())
+            db_pipeline = db_pipelines[active_pipeline.get_id()]
 
             # Get current status of pipeline runner
             curr_status = active_pipeline.get_status()
@@ -26,7 +33,7 @@ class RunWorker(StatusWorker):
             if curr_status in [PipelineStatus.READY, PipelineStatus.LOADING, PipelineStatus.RUNNING]:
 
                 # Cancel pipeline if pipeline has been set to cancelled in the database
-                if db_pipeline.status.description.upper() == PipelineStatus.CANCELLING:
+                if db_pipeline.status_id == self.db_helper.statuses[PipelineStatus.CANCELLING]:
                     logging.error("(RunWorker) Pipeline '%s' has been cancelled from the database by the user!" % active_pipeline.get_id())
                     active_pipeline.cancel()
                     continue
@@ -35,9 +42,10 @@ class RunWorker(StatusWorker):
                 self.sync_run_status(db_pipeline, curr_status)
 
                 # Check to see if pipeline has exceeded it's runtime
+                # Clock of pipelines launched ahead of time doesn't start until they're admitted
                 create_time = active_pipeline.get_start_time()
-                max_runtime = db_pipeline.analysis_type.max_run_time
-                if self.__time_elapsed(start=create_time, end=datetime.now()) > max_runtime:
+                max_runtime = db_pipeline.max_run_time
+                if create_time is not None and self.__time_elapsed(start=create_time, end=datetime.now()) > max_runtime:
                     # Cancel the job if it's exceeded it's time limit
                     logging.error("(RunWorker) Pipeline '%s' has exceeded maximum runtime (%d hours)!" % (active_pipeline.get_id(), max_runtime))
                     active_pipeline.cancel()
@@ -51,12 +59,13 @@ class RunWorker(StatusWorker):
                 # Record pipeline runtime in database
                 start_time              = active_pipeline.get_start_time()
                 end_time                = active_pipeline.get_end_time()
-                db_pipeline.run_time    = self.__time_elapsed(start=start_time, end=end_time)
+                run_time                = 0 if start_time is None else self.__time_elapsed(start=start_time, end=end_time)
+                self.db_helper.buffer_update(db_pipeline.analysis_id, run_time=run_time)
 
                 # Record commit version in database
                 cc_version = active_pipeline.get_cc_version()
                 if cc_version is not None:
-                    db_pipeline.git_commit = cc_version
+                    self.db_helper.buffer_update(db_pipeline.analysis_id, git_commit=cc_version)
 
                 # Record pipeline success status in database
                 curr_err_type           = active_pipeline.get_err_type()
@@ -72,16 +81,13 @@ class RunWorker(StatusWorker):
                 logging.debug("Removing pipeline '%s' from pipeline queue!" % active_pipeline.get_id())
                 self.pipeline_queue.remove_pipeline(active_pipeline.get_id())
 
-            # Commit any changes to database
-            session.commit()
-
     def sync_run_status(self, pipeline, curr_status):
 
         # Sync pipeline status in database with current pipeline_runner status
-        if pipeline.status.description != curr_status:
+        if pipeline.status_id != self.db_helper.statuses[curr_status]:
 
-            # Update database record to be current with pipeline runner
-            self.db_helper.update_status(pipeline, status=curr_status)
+            # Buffer update to make database record current with pipeline runner
+            self.db_helper.buffer_status(pipeline.analysis_id, status=curr_status)
 
     def sync_error_status(self, pipeline, curr_err_type, curr_err_msg):
 
@@ -89,18 +95,18 @@ class RunWorker(StatusWorker):
             # Case: Pipeline successfully completed.
             # Post a dummy report until GAP run report is processed.
             logging.debug("(RunWorker) Pipeline '%s' was successful! Awaiting report from queue..." % pipeline.analysis_id)
-            self.db_helper.update_error_type(pipeline, error_type=PipelineError.REPORT)
+            self.db_helper.buffer_error_type(pipeline.analysis_id, error_type=PipelineError.REPORT)
 
         elif curr_err_type == PipelineError.CANCEL:
             # Case: Run cancelled by user due to timeout or upon daemon exit
             # Post report because any GAP report will attribute errors to CTRL+C interrupt instead of cancellation
             logging.debug("(RunWorker) Pipeline '%s' failed due to cancellation!" % pipeline.analysis_id)
-            self.db_helper.update_error_type(pipeline, error_type=PipelineError.CANCEL)
+            self.db_helper.buffer_error_type(pipeline.analysis_id, error_type=PipelineError.CANCEL)
 
         else:
             # Case: Run fail or Load fail. Write error report as is.
             logging.debug("(RunWorker) Pipeline '%s' failed due to loading or runtime error!" % pipeline.analysis_id)
-            self.db_helper.update_error_type(pipeline, error_type=curr_err_type, extra_error_msg=curr_err_msg)
+            self.db_helper.buffer_error_type(pipeline.analysis_id, error_type=curr_err_type, extra_error_msg=curr_err_msg)
 
     @staticmethod
     def __time_elapsed(start, end):
@@ -18,6 +18,9 @@ class StatusWorker(threading.Thread):
         # Queue for holding currently running pipelines
         self.pipeline_queue = pipeline_queue
 
+        # Name thread after worker so its database activity can be attributed to it
+        self.name = self.__class__.__name__
+
         # Run as a daemon so thread will quit upon error in main program
         self.daemon = True
 
@@ -48,6 +51,9 @@ class StatusWorker(threading.Thread):
                 with self.db_helper.session_context() as session:
                     self.task(session)
 
+                # Write any status updates buffered during the task
+                self.db_helper.flush_updates()
+
                 # Sleep for a user-defined number of seconds
                 time.sleep(self.sleep_time)
 
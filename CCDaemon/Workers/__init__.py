@@ -3,4 +3,5 @@ from PipelineRunner import PipelineRunner
 from ReportWorker import ReportWorker
 from LaunchWorker import LaunchWorker
 from RunWorker import RunWorker
-
+from ArchiveWorker import ArchiveWorker
+from CancelWorker import CancelWorker
@@ -5,7 +5,7 @@ import os
 import sys
 
 from Config import ConfigParser
-from CCDaemon.Database import DBHelper
+from CCDaemon.Database import DBHelper, DBError
 from CCDaemon.Pipeline import PipelineStatus, PipelineError
 from RunDaemon import configure_logging
 
@@ -34,13 +34,20 @@ def configure_argparser(argparser_obj):
                                help="Path to config file containing input files "
                                     "and information for one or more samples.")
 
-    # Type of action to be performed on pipeline queue
-    argparser_obj.add_argument("--pipeline-id",
-                               action="store",
-                               type=int,
-                               dest="pipeline_id",
-                               required=True,
-                               help="Database ID of pipeline to cancel.")
+    # Cancel either a single pipeline or every active pipeline of an analysis type
+    target_group = argparser_obj.add_mutually_exclusive_group(required=True)
+
+    target_group.add_argument("--pipeline-id",
+                              action="store",
+                              type=int,
+                              dest="pipeline_id",
+                              help="Database ID of pipeline to cancel.")
+
+    target_group.add_argument("--analysis-type-id",
+                              action="store",
+                              type=int,
+                              dest="analysis_type_id",
+                              help="Database ID of analysis type whose active pipelines will all be cancelled.")
 
 def main():
 
@@ -65,39 +72,71 @@ def main():
     try:
         # Connect to database
         logging.info("Connecting to database...")
+        # Use a single pooled connection and only sync the statuses and error type needed to cancel
         db_helper = DBHelper(username=config["db_helper"]["username"],
                              password=config["db_helper"]["password"],
                              database=config["db_helper"]["database"],
                              host=config["db_helper"]["host"],
-                             mysql_driver=config["db_helper"]["mysql_driver"])
+                             mysql_driver=config["db_helper"]["mysql_driver"],
+                             pool_size=1,
+                             max_overflow=0,
+                             sync=False,
+                             archive_after_days=config["db_helper"]["archive_after_days"])
+        active_statuses = [PipelineStatus.IDLE, PipelineStatus.READY, PipelineStatus.LOADING, PipelineStatus.RUNNING]
+        db_helper.sync_statuses(active_statuses + [PipelineStatus.CANCELLING])
+        db_helper.sync_error_types([PipelineError.CANCEL])
+
+        # Cancellation signal table is created by the daemon when it starts
+        if not db_helper.cancel_signals_exist():
+            logging.error("Cancellation signal table doesn't exist! Start the CC-Daemon once to create it.")
+            raise DBError("Cancellation signal table doesn't exist!")
 
         # Create a session for interacting with database
         with db_helper.session_context() as session:
 
-            # Check to see if pipeline id actually exists
-            if not db_helper.pipeline_exists(session, args.pipeline_id):
-                logging.error("Pipeline with id '%s' doesn't exist in database!" % args.pipeline_id)
-                raise IOError("Invalid pipeline id: '%s'" % args.pipeline_id)
-
-            # Get pipeline record and current status using ID
-            pipeline_record = db_helper.get_pipeline(session, pipeline_id=args.pipeline_id)
-            curr_status     = pipeline_record.status.description.upper()
-
-            # Change pipeline status to CANCELLING if status permits
-            active_statuses = [PipelineStatus.IDLE, PipelineStatus.READY, PipelineStatus.LOADING, PipelineStatus.RUNNING]
-            if curr_status in active_statuses:
-                db_helper.update_status(pipeline_record, status=PipelineStatus.CANCELLING)
-                db_helper.update_error_type(pipeline_record, error_type=PipelineError.CANCEL, extra_error_msg="Manually cancelled by user.")
+            if args.analysis_type_id is not None:
+                # Cancel every active pipeline of the analysis type in a single statement
+                pipeline_ids = db_helper.bulk_update_status(session,
+                                                            from_statuses=active_statuses,
+                                                            status=PipelineStatus.CANCELLING,
+                                                            error_type=PipelineError.CANCEL,
+                                                            extra_error_msg="Manually cancelled by user.",
+                                                            analysis_type_id=args.analysis_type_id)
+
+                # Signal daemon so running pipelines are stopped without waiting for the next status poll
+                db_helper.signal_cancel(session, analysis_type_id=args.analysis_type_id)
+                logging.info("Cancelling %d active pipelines of analysis type '%s': %s" %
+                             (len(pipeline_ids), args.analysis_type_id, ", ".join([str(x) for x in pipeline_ids])))
                 cancelled = True
+
             else:
-                logging.warning("Not cancelling because pipeline is past point of cancelling! Current status: '%s'" % curr_status)
+                # Check to see if pipeline id actually exists
+                if not db_helper.pipeline_exists(session, args.pipeline_id, include_archived=True):
+                    logging.error("Pipeline with id '%s' doesn't exist in database!" % args.pipeline_id)
+                    raise IOError("Invalid pipeline id: '%s'" % args.pipeline_id)
+
+                # Get current status using ID whether pipeline is active or archived
+                curr_status     = db_helper.get_pipeline_status(session, pipeline_id=args.pipeline_id)
+
+                # Change pipeline status to CANCELLING if status permits
+                if curr_status in active_statuses:
+                    pipeline_record = db_helper.get_pipeline(session, pipeline_id=args.pipeline_id)
+                    db_helper.update_status(pipeline_record, status=PipelineStatus.CANCELLING)
+                    db_helper.update_error_type(pipeline_record, error_type=PipelineError.CANCEL, extra_error_msg="Manually cancelled by user.")
+                    db_helper.signal_cancel(session, pipeline_id=args.pipeline_id)
+                    cancelled = True
+                else:
+                    logging.warning("Not cancelling because pipeline is past point of cancelling! Current status: '%s'" % curr_status)
 
     except BaseException, e:
         logging.error("CC-Daemon-Cancel failed! No changes were made to the database!")
 
     finally:
         # Report that Pipeline has successfully been cancelled
-        if cancelled:
+        if cancelled and args.analysis_type_id is not None:
+            logging.info("Successfully cancelled pipelines with analysis type id: %s!" % args.analysis_type_id)
+            exit(0)
+        elif cancelled:
             logging.info("Successfully cancelled pipeline with id: %s!" % args.pipeline_id)
             exit(0)
         else:
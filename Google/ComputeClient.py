@@ -0,0 +1,301 @@
+import abc
+import json
+import logging
+import math
+import subprocess as sp
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from CCDaemon.Platform import RetryPolicy
+
+class ComputeClient(object):
+    # Client for managing instances in a single Google Compute Engine project and zone
+    __metaclass__ = abc.ABCMeta
+
+    # Clients shared by every processor using the same api, project and zone so connections are reused
+    shared_clients  = {}
+    shared_lock     = threading.Lock()
+
+    def __init__(self, project, zone):
+        self.project    = project
+        self.zone       = zone
+
+    @staticmethod
+    def get_shared(client_type, project, zone, api_url=None):
+        # Return the shared compute client of the requested type ('http' or 'gcloud')
+        key = (client_type, project, zone, api_url)
+        with ComputeClient.shared_lock:
+            if key not in ComputeClient.shared_clients:
+                if client_type == "http":
+                    ComputeClient.shared_clients[key] = HttpComputeClient(project, zone, api_url=api_url)
+                else:
+                    ComputeClient.shared_clients[key] = GcloudComputeClient(project, zone)
+            return ComputeClient.shared_clients[key]
+
+    @abc.abstractmethod
+    def create_instance(self, name, machine_type, image, boot_disk_size, service_account, startup_script,
+                        custom_cpus=None, custom_mem=None):
+        # Create an instance and return once it exists
+        pass
+
+    @abc.abstractmethod
+    def get_instance(self, name):
+        # Return instance resource as a dictionary or None if instance doesn't exist
+        pass
+
+    @abc.abstractmethod
+    def delete_instance(self, name, wait=True):
+        # Delete an instance. Instances that don't exist are ignored.
+        pass
+
+    @abc.abstractmethod
+    def list_instances(self, filter_expr=None):
+        # Return list of instance resources matching an optional filter expression
+        pass
+
+    @abc.abstractmethod
+    def name_filter(self, names):
+        # Return filter expression matching instances with any of the given names
+        pass
+
+
+class GcloudComputeClient(ComputeClient):
+    # Manages instances by running the gcloud CLI
+
+    def create_instance(self, name, machine_type, image, boot_disk_size, service_account, startup_script,
+                        custom_cpus=None, custom_mem=None):
+
+        # Create base command
+        args = list()
+        args.append("gcloud compute instances create %s" % name)
+
+        # Specify the zone where instance will exits
+        args.append("--zone")
+        args.append(self.zone)
+
+        # Specify boot disk image
+        args.append("--image")
+        args.append(str(image))
+
+        # Set boot disk size
+        args.append("--boot-disk-size")
+        if boot_disk_size >= 1024:
+            args.append("%dTB" % int(boot_disk_size/1024))
+        else:
+            args.append("%dGB" % int(boot_disk_size))
+
+        # Set boot disk type
+        args.append("--boot-disk-type")
+        args.append("pd-standard")
+
+        # Specify google cloud access scopes
+        args.append("--scopes")
+        args.append("cloud-platform")
+
+        # Specify google cloud service account
+        args.append("--service-account")
+        args.append(str(service_account))
+
+        # Determine Google Instance type and insert into gcloud command
+        if custom_cpus is not None:
+            args.append("--custom-cpu")
+            args.append(str(custom_cpus))
+
+            args.append("--custom-memory")
+            args.append(str(custom_mem))
+        else:
+            args.append("--machine-type")
+            args.append(machine_type)
+
+        # Add metadata to run base Google startup-script
+        args.append("--metadata-from-file")
+        args.append("startup-script=%s" % startup_script)
+
+        self.__run(" ".join(args))
+
+    def get_instance(self, name):
+        cmd = "gcloud compute instances describe %s --format json --zone %s" % (name, self.zone)
+        proc        = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+        out, err    = proc.communicate()
+        if proc.returncode != 0:
+            if "not found" in err.lower():
+                return None
+            logging.error("(GcloudComputeClient) Unable to describe instance '%s'! Received the following error:\n%s" % (name, err))
+            raise RuntimeError("Unable to describe instance %s!" % name)
+        return json.loads(out)
+
+    def delete_instance(self, name, wait=True):
+        cmd = "gcloud compute instances delete %s --zone %s --quiet" % (name, self.zone)
+        if not wait:
+            cmd += " --async"
+        proc        = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+        out, err    = proc.communicate()
+        if proc.returncode != 0 and "not found" not in err.lower():
+            logging.error("(GcloudComputeClient) Unable to delete instance '%s'! Received the following error:\n%s" % (name, err))
+            raise RuntimeError("Unable to delete instance %s!" % name)
+
+    def list_instances(self, filter_expr=None):
+        cmd = "gcloud compute instances list --format json --zones %s" % self.zone
+        if filter_expr is not None:
+            cmd += " --filter '%s'" % filter_expr
+        return json.loads(self.__run(cmd))
+
+    def name_filter(self, names):
+        return "name:(%s)" % " ".join(names)
+
+    @staticmethod
+    def __run(cmd):
+        proc        = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+        out, err    = proc.communicate()
+        if proc.returncode != 0:
+            logging.error("(GcloudComputeClient) Command failed: %s\nReceived the following error:\n%s" % (cmd, err))
+            raise RuntimeError("gcloud command failed!")
+        return out
+
+
+class HttpComputeClient(ComputeClient):
+    # Manages instances through the Compute Engine REST API
+    # Keeps connections alive in a pool, retries transient errors with backoff, and caches the access token
+
+    # Seconds an access token is reused before a new one is requested (tokens are valid for an hour)
+    TOKEN_LIFETIME = 3000
+
+    # Default url of Compute Engine API
+    API_URL = "https://compute.googleapis.com/compute/v1"
+
+    def __init__(self, project, zone, api_url=None, pool_size=10, num_retries=3):
+        super(HttpComputeClient, self).__init__(project, zone)
+
+        # Base url of zone resources. Can be pointed at a local fake server for testing.
+        self.api_url    = (self.API_URL if api_url is None else api_url).rstrip("/")
+        self.zone_url   = "%s/projects/%s/zones/%s" % (self.api_url, project, zone)
+
+        # Number of times requests are retried on connection errors, throttling and server errors
+        self.num_retries = num_retries
+
+        self.session = requests.Session()
+        self.session.mount(self.api_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+        # Cached OAuth2 access token
+        self.token              = None
+        self.token_time         = 0
+        self.token_lock         = threading.Lock()
+
+        # Disabling low levels of logging from module requests
+        logging.getLogger("requests").setLevel(logging.WARNING)
+        logging.getLogger("urllib3").setLevel(logging.WARNING)
+
+    def create_instance(self, name, machine_type, image, boot_disk_size, service_account, startup_script,
+                        custom_cpus=None, custom_mem=None):
+
+        if custom_cpus is not None:
+            # Custom machine types are specified in MB of memory, rounded up to a multiple of 256 MB
+            machine_type = "custom-%d-%d" % (custom_cpus, int(math.ceil(custom_mem * 1024 / 256.0)) * 256)
+
+        with open(startup_script, "r") as fh:
+            startup_script_string = fh.read()
+
+        body = {"name":         name,
+                "machineType":  "zones/%s/machineTypes/%s" % (self.zone, machine_type),
+                "disks":        [{"boot":               True,
+                                  "autoDelete":         True,
+                                  "initializeParams":   {"sourceImage": "global/images/%s" % image,
+                                                         "diskSizeGb":  str(int(boot_disk_size)),
+                                                         "diskType":    "zones/%s/diskTypes/pd-standard" % self.zone}}],
+                "networkInterfaces":    [{"network":        "global/networks/default",
+                                          "accessConfigs":  [{"type": "ONE_TO_ONE_NAT", "name": "External NAT"}]}],
+                "serviceAccounts":      [{"email":  service_account,
+                                          "scopes": ["https://www.googleapis.com/auth/cloud-platform"]}],
+                "metadata":             {"items": [{"key": "startup-script", "value": startup_script_string}]}}
+
+        operation = self.__request("POST", "%s/instances" % self.zone_url, json=body)
+        self.__wait_operation(operation)
+
+    def get_instance(self, name):
+        return self.__request("GET", "%s/instances/%s" % (self.zone_url, name), allow_missing=True)
+
+    def delete_instance(self, name, wait=True):
+        operation = self.__request("DELETE", "%s/instances/%s" % (self.zone_url, name), allow_missing=True)
+        if operation is not None and wait:
+            self.__wait_operation(operation)
+
+    def list_instances(self, filter_expr=None):
+        instances   = []
+        params      = {} if filter_expr is None else {"filter": filter_expr}
+        while True:
+            page = self.__request("GET", "%s/instances" % self.zone_url, params=params)
+            instances.extend(page.get("items", []))
+            if "nextPageToken" not in page:
+                return instances
+            params["pageToken"] = page["nextPageToken"]
+
+    def name_filter(self, names):
+        return " OR ".join(['(name = "%s")' % name for name in names])
+
+    def __wait_operation(self, operation):
+        # Wait for a zone operation to finish and raise an error if it failed
+        while operation["status"] != "DONE":
+            operation = self.__request("POST", "%s/operations/%s/wait" % (self.zone_url, operation["name"]))
+
+        if "error" in operation:
+            errors = [error.get("message", "") for error in operation["error"].get("errors", [])]
+            logging.error("(HttpComputeClient) Operation '%s' failed! Received the following errors:\n%s" %
+                          (operation["name"], "\n".join(errors)))
+            raise RuntimeError("Compute operation %s failed!" % operation["name"])
+
+    def __request(self, method, url, allow_missing=False, **kwargs):
+        # Make an authenticated request and return the decoded response
+        # Request is repeated once with a fresh token if the cached token was rejected
+        # Throttled requests are retried with backoff. Idempotent requests are also retried on connection and server errors.
+        idempotent      = method in ["GET", "DELETE"] or url.endswith("/wait")
+        refresh_token   = False
+        token_refreshed = False
+        attempt         = 0
+        while True:
+            headers         = {"Authorization": "Bearer %s" % self.__get_token(refresh=refresh_token)}
+            refresh_token   = False
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=120, **kwargs)
+            except requests.exceptions.ConnectionError:
+                if idempotent and RetryPolicy.get(RetryPolicy.TRANSIENT).retry(attempt, self.num_retries - attempt):
+                    attempt += 1
+                    continue
+                raise
+
+            if response.status_code == 401 and not token_refreshed:
+                refresh_token   = True
+                token_refreshed = True
+                continue
+
+            if response.status_code == 429 or (idempotent and response.status_code in [500, 502, 503, 504]):
+                policy = RetryPolicy.get(RetryPolicy.THROTTLED if response.status_code == 429 else RetryPolicy.TRANSIENT)
+                if policy.retry(attempt, self.num_retries - attempt):
+                    attempt += 1
+                    continue
+
+            if response.status_code == 404 and allow_missing:
+                return None
+
+            if response.status_code >= 400:
+                logging.error("(HttpComputeClient) %s %s failed with status %d! Received the following error:\n%s" %
+                              (method, url, response.status_code, response.text))
+                raise RuntimeError("Compute API request failed with status %d!" % response.status_code)
+
+            return response.json()
+
+    def __get_token(self, refresh=False):
+        # Return cached access token of the authenticated account, requesting a new one if it's expired
+        with self.token_lock:
+            if refresh or self.token is None or time.time() - self.token_time > self.TOKEN_LIFETIME:
+                proc        = sp.Popen("gcloud auth print-access-token", stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+                out, err    = proc.communicate()
+                if proc.returncode != 0:
+                    logging.error("(HttpComputeClient) Unable to get access token! Received the following error:\n%s" % err)
+                    raise RuntimeError("Unable to get Google Cloud access token!")
+                self.token      = out.strip()
+                self.token_time = time.time()
+            return self.token
+
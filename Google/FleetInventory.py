@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+class FleetInventory(object):
+    # Instances in a zone, listed with one call and shared for a short time by everyone asking about them
+    # Concurrent callers needing a fresh list wait on the call already in flight instead of making their own
+
+    # Inventories shared by every processor using the same compute client
+    shared_inventories  = {}
+    shared_lock         = threading.Lock()
+
+    def __init__(self, compute, ttl=10):
+
+        # Client used to list instances
+        self.compute = compute
+
+        # Seconds a list of instances is reused
+        self.ttl = ttl
+
+        # Instances indexed by name and time the list call that returned them started
+        self.instances      = None
+        self.list_time      = 0
+        self.inventory_lock = threading.Lock()
+
+        # List call currently in flight
+        self.listing        = None
+
+        # Usage statistics
+        self.num_lists      = 0
+        self.num_hits       = 0
+
+    @staticmethod
+    def get_shared(compute, ttl=10):
+        # Return inventory shared by every processor using the same compute client
+        with FleetInventory.shared_lock:
+            key = id(compute)
+            if key not in FleetInventory.shared_inventories:
+                FleetInventory.shared_inventories[key] = FleetInventory(compute, ttl=ttl)
+            return FleetInventory.shared_inventories[key]
+
+    def get_instances(self, since=None):
+        # Return instances indexed by name
+        # List is refreshed if it's older than the TTL or was started before 'since' (a time.time() timestamp)
+        while True:
+            with self.inventory_lock:
+                if self.__is_fresh(since):
+                    self.num_hits += 1
+                    return self.instances
+
+                listing = self.listing
+                if listing is None:
+                    # Become the caller that lists instances for everyone
+                    listing         = threading.Event()
+                    self.listing    = listing
+                    break
+
+            # Wait for the list call in flight and check whether it's fresh enough
+            listing.wait()
+
+        try:
+            list_time = time.time()
+            instances = dict([(instance["name"], instance) for instance in self.compute.list_instances()])
+            with self.inventory_lock:
+                self.instances  = instances
+                self.list_time  = list_time
+                self.num_lists  += 1
+            return instances
+
+        except BaseException, e:
+            logging.error("(FleetInventory) Unable to list instances in zone %s!" % self.compute.zone)
+            if e.message != "":
+                logging.error("Received the following error: %s" % e.message)
+            raise
+
+        finally:
+            with self.inventory_lock:
+                self.listing = None
+            listing.set()
+
+    def exists(self, name, since=None):
+        # Determine whether an instance exists
+        return name in self.get_instances(since=since)
+
+    def get_instance(self, name, since=None):
+        # Return instance resource or None if instance doesn't exist
+        return self.get_instances(since=since).get(name, None)
+
+    def invalidate(self):
+        # Force next question to list instances again (e.g. after creating or deleting an instance)
+        with self.inventory_lock:
+            self.list_time = 0
+
+    def __is_fresh(self, since):
+        if self.instances is None:
+            return False
+        if since is not None and self.list_time < since:
+            return False
+        return time.time() - self.list_time <= self.ttl
+
+    def __str__(self):
+        with self.inventory_lock:
+            num_instances = 0 if self.instances is None else len(self.instances)
+            return "FleetInventory: %d instances, %d list calls, %d cached answers" % (num_instances, self.num_lists, self.num_hits)
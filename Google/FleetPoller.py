@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+
+class FleetWaiter(object):
+    # Instance a processor is waiting on and the state the poller last saw it in
+
+    def __init__(self, name):
+        self.name       = name
+
+        # Set once instance is ready or has disappeared
+        self.event      = threading.Event()
+        self.state      = None
+
+        # Number of consecutive polls instance was missing from
+        self.misses     = 0
+
+
+class FleetPoller(threading.Thread):
+    # Polls startup of every booting instance in a zone with one filtered list call per interval
+    # Replaces one describe call every couple of seconds for each instance being created
+
+    # States an instance can be waited into
+    READY       = "READY"
+    MISSING     = "MISSING"
+    TIMEOUT     = "TIMEOUT"
+    CANCELLED   = "CANCELLED"
+
+    # Maximum number of instance names in a single list filter
+    MAX_NAMES_PER_CALL = 50
+
+    # Pollers shared by every processor using the same compute client
+    shared_pollers  = {}
+    shared_lock     = threading.Lock()
+
+    def __init__(self, compute, poll_interval=2, max_interval=30, max_misses=5):
+        super(FleetPoller, self).__init__()
+
+        # Client used to list instances
+        self.compute = compute
+
+        # Seconds between polls. Polls back off up to max_interval while the list call is failing.
+        self.poll_interval  = poll_interval
+        self.max_interval   = max_interval
+        self.curr_interval  = poll_interval
+
+        # Consecutive polls an instance can be missing from before it's considered gone
+        # New instances can take a moment to show up in list results
+        self.max_misses = max_misses
+
+        # Instances currently being waited on
+        self.waiters        = {}
+        self.waiter_lock    = threading.Lock()
+
+        # Wakes poller when the first instance is waited on
+        self.wake           = threading.Event()
+
+        # Usage statistics
+        self.num_polls      = 0
+        self.num_failures   = 0
+
+        # Stop variable
+        self.stopped = False
+
+        # Run as a daemon so thread will quit upon error in main program
+        self.daemon = True
+
+    @staticmethod
+    def get_shared(compute, poll_interval=2):
+        # Return running poller shared by every processor using the same compute client
+        with FleetPoller.shared_lock:
+            key = id(compute)
+            if key not in FleetPoller.shared_pollers:
+                poller = FleetPoller(compute, poll_interval=poll_interval)
+                poller.start()
+                FleetPoller.shared_pollers[key] = poller
+            return FleetPoller.shared_pollers[key]
+
+    def run(self):
+        while not self.is_stopped():
+
+            # Sleep until there's something to poll
+            with self.waiter_lock:
+                names = self.waiters.keys()
+                if len(names) == 0:
+                    self.wake.clear()
+            if len(names) == 0:
+                self.wake.wait()
+                continue
+
+            self.__poll(names)
+            time.sleep(self.curr_interval)
+
+    def wait_until_ready(self, name, timeout=1200, is_cancelled=None):
+        # Block until an instance's startup-script has completed and return the state it ended up in
+        waiter = FleetWaiter(name)
+        with self.waiter_lock:
+            self.waiters[name] = waiter
+        self.wake.set()
+
+        try:
+            start_time = time.time()
+            while not waiter.event.wait(1):
+                if is_cancelled is not None and is_cancelled():
+                    return FleetPoller.CANCELLED
+                if time.time() - start_time > timeout:
+                    return FleetPoller.TIMEOUT
+            return waiter.state
+
+        finally:
+            with self.waiter_lock:
+                self.waiters.pop(name, None)
+
+    def stop(self):
+        with self.waiter_lock:
+            self.stopped = True
+        self.wake.set()
+
+    def is_stopped(self):
+        with self.waiter_lock:
+            return self.stopped
+
+    def __poll(self, names):
+        # List every waited instance and notify waiters whose instance is ready or gone
+        try:
+            instances = {}
+            for i in range(0, len(names), self.MAX_NAMES_PER_CALL):
+                chunk = names[i:i+self.MAX_NAMES_PER_CALL]
+                for instance in self.compute.list_instances(filter_expr=self.compute.name_filter(chunk)):
+                    instances[instance["name"]] = instance
+
+        except BaseException, e:
+            # Back off while the API is failing
+            self.num_failures   += 1
+            self.curr_interval  = min(self.curr_interval * 2, self.max_interval)
+            logging.warning("(FleetPoller) Unable to list instances! Polling again in %d seconds." % self.curr_interval)
+            if e.message != "":
+                logging.warning("Received the following error: %s" % e.message)
+            return
+
+        self.num_polls      += 1
+        self.curr_interval  = self.poll_interval
+
+        with self.waiter_lock:
+            for name in names:
+                if name not in self.waiters:
+                    continue
+                waiter = self.waiters[name]
+
+                if name not in instances:
+                    waiter.misses += 1
+                    if waiter.misses > self.max_misses:
+                        waiter.state = FleetPoller.MISSING
+                        waiter.event.set()
+                    continue
+
+                waiter.misses = 0
+                if self.is_ready(instances[name]):
+                    waiter.state = FleetPoller.READY
+                    waiter.event.set()
+
+    @staticmethod
+    def is_ready(instance):
+        # Startup-script adds "READY" to instance metadata once it has completed
+        for item in instance.get("metadata", {}).get("items", []):
+            if item["key"] == "READY":
+                return True
+        return False
+
+    def __str__(self):
+        with self.waiter_lock:
+            return "FleetPoller: %d instances waiting, %d polls, %d failed polls" % (len(self.waiters), self.num_polls, self.num_failures)
@@ -7,7 +7,7 @@ from StringIO import StringIO
 
 from configobj import ConfigObj
 
-from CCDaemon.Platform import Platform
+from CCDaemon.Platform import Platform, RetryPolicy
 from GoogleProcessor import GoogleProcessor
 
 class GooglePlatform(Platform):
@@ -74,16 +74,24 @@ class GooglePlatform(Platform):
         return cc_config_strings
 
     def upload_file(self, src_path, dest_path, num_retries=2):
-        cmd = "gcloud compute scp %s gap@%s:%s --zone %s" % (src_path, self.processor.name, dest_path, self.zone)
-        proc = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
-        proc.communicate()
-        if proc.returncode != 0:
-            if num_retries > 0:
-                self.upload_file(src_path, dest_path, num_retries-1)
-            else:
+        attempt = 0
+        while True:
+            cmd = self.processor.transport.upload_cmd(src_path, dest_path)
+            proc = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+            out, err = proc.communicate()
+            if proc.returncode == 0:
+                return
+
+            # Wait before retrying so uploads failing together don't retry together
+            policy = RetryPolicy.for_error(err, proc.returncode, default=RetryPolicy.CONNECTION)
+            if not policy.retry(attempt, num_retries - attempt):
                 logging.error("(%s) Unable to upload file to platform: %s!" % (self.name, src_path))
                 raise RuntimeError("Unable to upload config file to platform!")
 
+            # Reconnect in case the connection to the instance was lost
+            self.processor.transport.reset()
+            attempt += 1
+
     def init_processor(self):
         # Initialize and return the main processor needed to load/manage the platform
         logging.info("Creating CloudConductor runner platform instance...")
@@ -117,17 +125,20 @@ class GooglePlatform(Platform):
     def cat_file(self, file_path, num_retries=2):
         # Cat a file and return it's contents
         cmd = "gsutil cat {0}".format(file_path)
-        proc = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
-
-        out, err = proc.communicate()
-        if proc.returncode != 0:
-            if num_retries > 0:
-                return self.cat_file(file_path, num_retries-1)
-            logging.error("Unable to cat file: {0}".format(file_path))
-            if len(err) > 0:
-                logging.error("Received following error: %s" % err)
+        attempt = 0
+        while True:
+            proc = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+            out, err = proc.communicate()
+            if proc.returncode == 0:
+                return out
 
-        return out
+            policy = RetryPolicy.for_error(err, default=RetryPolicy.TRANSIENT)
+            if not policy.retry(attempt, num_retries - attempt):
+                logging.error("Unable to cat file: {0}".format(file_path))
+                if len(err) > 0:
+                    logging.error("Received following error: %s" % err)
+                return out
+            attempt += 1
 
     def transfer(self, src_path, dest_dir, dest_file=None, log_transfer=True, job_name=None, wait=False):
         # Transfer a remote file from src_path to a local directory dest_dir
@@ -154,28 +165,28 @@ class GooglePlatform(Platform):
 
     def mkdir(self, dir_path, job_name=None, wait=False):
         # Makes a directory if it doesn't already exists
+        job_name = "mkdir_%s" % self.generate_unique_id() if job_name is None else job_name
+        self.run_command(job_name, self.mkdir_cmd(dir_path))
+
+    def mkdir_cmd(self, dir_path):
+        # Return command that makes a directory if it doesn't already exist when run on the main instance
         # Standardize dir_path
         dir_path = self.standardize_dir(dir_path)
-        job_name = "mkdir_%s" % self.generate_unique_id() if job_name is None else job_name
 
         if ":" in dir_path:
             # Make bucket if it doesn't already exist on google cloud
-            bucket = "/".join(dir_path.split("/")[0:3]) + "/"
-            if not self.path_exists(bucket):
-                logging.debug("Creating final output bucket: %s" % bucket)
-                bucket_job_name = "mk_bucket_%s" % bucket
-                region      = "-".join(self.zone.split("-")[:-1])
-                cmd         = "gsutil mb -p %s -c regional -l %s %s" % (self.google_project, region, bucket)
-                self.run_command(bucket_job_name, cmd)
-            # Generate command to add dummy file to bucket directory and delete local copy
-            logging.debug("Creating dummy output file in final output dir on google storage...")
-            cmd = "touch dummy.txt ; gsutil cp dummy.txt %s" % dir_path
-        else:
-            # Generate command to make directory locally on the main instance
-            cmd = "sudo mkdir -p %s" % dir_path
+            # Check again if creation fails in case the bucket was created by another platform in the meantime
+            bucket      = "/".join(dir_path.split("/")[0:3]) + "/"
+            region      = "-".join(self.zone.split("-")[:-1])
+            mk_bucket   = "gsutil ls %s >/dev/null 2>&1 || gsutil mb -p %s -c regional -l %s %s || gsutil ls %s >/dev/null" % \
+                          (bucket, self.google_project, region, bucket, bucket)
+
+            # Add dummy file to bucket directory if directory doesn't exist yet
+            mk_dir      = "gsutil ls %s >/dev/null 2>&1 || ( touch dummy.txt ; gsutil cp dummy.txt %s )" % (dir_path, dir_path)
+            return "( %s ) && ( %s )" % (mk_bucket, mk_dir)
 
-        # Run command
-        self.run_command(job_name, cmd)
+        # Make directory locally on the main instance
+        return "sudo mkdir -p %s" % dir_path
 
     def clean_up(self):
         logging.info("Cleaning up Google Cloud Platform.")
@@ -188,10 +199,10 @@ class GooglePlatform(Platform):
         except:
             logging.warning("(%s) Could not remove dummy input file on google cloud!")
 
-        # Destroy main processor
+        # Recycle or destroy main processor
         try:
             if self.processor is not None:
-                self.processor.destroy()
+                self.release_processor()
         except RuntimeError:
             logging.warning("(%s) Could not destroy instance!" % self.processor.name())
 
@@ -1,16 +1,16 @@
-import json
 import logging
 import math
 import os
-import subprocess as sp
 import sys
 import threading
 import time
 
-import requests
-
-from CCDaemon.Platform import Process
-from CCDaemon.Platform import Processor
+from CCDaemon.Platform import Processor, RetryPolicy
+from GoogleTransport import TRANSPORTS
+from ComputeClient import ComputeClient
+from PriceCatalog import PriceCatalog
+from FleetPoller import FleetPoller
+from FleetInventory import FleetInventory
 
 
 class GoogleProcessor(Processor):
@@ -32,6 +32,28 @@ class GoogleProcessor(Processor):
         self.boot_disk_size     = kwargs.get("boot_disk_size")
         self.disk_image         = kwargs.get("disk_image")
 
+        # Transport used to run commands and upload files to the instance
+        transport_type          = kwargs.get("ssh_transport", "multiplexed")
+        self.transport          = TRANSPORTS[transport_type](name, self.zone,
+                                                             control_persist=kwargs.get("ssh_control_persist", 600))
+
+        # Client for creating, polling and deleting the instance
+        # The gcloud CLI is used unless the REST API client is explicitly enabled
+        self.compute            = ComputeClient.get_shared(kwargs.get("compute_client", "gcloud"),
+                                                           kwargs.get("google_project"),
+                                                           self.zone,
+                                                           api_url=kwargs.get("compute_api_url", None))
+
+        # Poller shared by every instance booting in the zone
+        self.poller             = FleetPoller.get_shared(self.compute, poll_interval=kwargs.get("fleet_poll_interval", 2))
+
+        # Shared list of instances answering whether instances exist
+        self.inventory          = FleetInventory.get_shared(self.compute, ttl=kwargs.get("fleet_inventory_ttl", 10))
+
+        # Prices used to choose instance type
+        self.price_catalog      = PriceCatalog.get_shared(cache_file=kwargs.get("price_cache_file", None),
+                                                          ttl=kwargs.get("price_cache_ttl", 86400))
+
         # Get maximum resource settings
         self.MAX_NR_CPUS        = 4
         self.MAX_MEM            = 20
@@ -53,6 +75,25 @@ class GoogleProcessor(Processor):
         with self.status_lock:
             return self.status
 
+    def is_available(self):
+        # Instance may have been preempted or deleted outside the daemon
+        return self.get_status() == GoogleProcessor.AVAILABLE and self.instance_exists()
+
+    def instance_exists(self, since=None):
+        # Determine whether instance exists on Google Cloud according to the shared fleet inventory
+        # Falls back to describing the instance if the inventory can't be listed
+        try:
+            return self.inventory.exists(self.name, since=since)
+        except BaseException:
+            logging.warning("(%s) Unable to list instances! Describing instance instead..." % self.name)
+
+        # Instance is assumed to exist if it can't be described either
+        try:
+            return self.compute.get_instance(self.name) is not None
+        except BaseException:
+            logging.warning("(%s) Unable to determine whether instance exists!" % self.name)
+            return True
+
     def create(self):
         # Begin running command to create the instance on Google Cloud
 
@@ -65,57 +106,30 @@ class GoogleProcessor(Processor):
         logging.info("(%s) Process 'create' started!" % self.name)
         logging.debug("(%s) Instance type is %s." % (self.name, instance_type))
 
-        # Create base command
-        args = list()
-        args.append("gcloud compute instances create %s" % self.name)
-
-        # Specify the zone where instance will exits
-        args.append("--zone")
-        args.append(self.zone)
-
-        # Specify boot disk image
-        args.append("--image")
-        args.append(str(self.disk_image))
-
-        # Set boot disk size
-        args.append("--boot-disk-size")
-        if self.boot_disk_size >= 1024:
-            args.append("%dTB" % int(self.boot_disk_size/1024))
-        else:
-            args.append("%dGB" % int(self.boot_disk_size))
-
-        # Set boot disk type
-        args.append("--boot-disk-type")
-        args.append("pd-standard")
-
-        # Specify google cloud access scopes
-        args.append("--scopes")
-        args.append("cloud-platform")
-
-        # Specify google cloud service account
-        args.append("--service-account")
-        args.append(str(self.service_acct))
-
-        # Determine Google Instance type and insert into gcloud command
-        if "custom" in instance_type:
-            args.append("--custom-cpu")
-            args.append(str(self.nr_cpus))
-
-            args.append("--custom-memory")
-            args.append(str(self.mem))
-        else:
-            args.append("--machine-type")
-            args.append(instance_type)
+        # Custom instance types are specified by CPUs and memory instead of machine type
+        custom_cpus = self.nr_cpus if "custom" in instance_type else None
+        custom_mem  = self.mem if "custom" in instance_type else None
 
         # Add metadata to run base Google startup-script
         exec_dir = sys.path[0]
         startup_script_location = os.path.join(exec_dir, "Google/GoogleStartupScript.sh")
-        args.append("--metadata-from-file")
-        args.append("startup-script=%s" % startup_script_location)
 
-        # Run command, wait for instance to appear on Google Cloud
-        self.processes["create"] = Process(" ".join(args), stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
-        self.wait_process("create")
+        # Create instance and wait for it to appear on Google Cloud
+        try:
+            self.compute.create_instance(self.name,
+                                         machine_type=instance_type,
+                                         image=self.disk_image,
+                                         boot_disk_size=self.boot_disk_size,
+                                         service_account=self.service_acct,
+                                         startup_script=startup_script_location,
+                                         custom_cpus=custom_cpus,
+                                         custom_mem=custom_mem)
+        except BaseException, e:
+            logging.error("(%s) Process 'create' failed!" % self.name)
+            if e.message != "":
+                logging.error("(%s) The following error was received: %s" % (self.name, e.message))
+            raise RuntimeError("Instance %s has failed!" % self.name)
+        logging.info("(%s) Process 'create' complete!" % self.name)
 
         # Wait for ssh to initialize and startup script to complete after instance is live
         self.wait_until_ready()
@@ -134,27 +148,36 @@ class GoogleProcessor(Processor):
         # Set status to indicate that instance cannot run commands and is destroying
         self.set_status(GoogleProcessor.BUSY)
 
-        logging.info("(%s) Process 'destroy' started!" % self.name)
+        # Close any connection held open to the instance
+        self.transport.close()
 
-        # Create base command to destroy instance
-        args = list()
-        args.append("gcloud compute instances delete %s" % self.name)
+        logging.info("(%s) Process 'destroy' started!" % self.name)
 
-        # Specify the zone where instance is running
-        args.append("--zone")
-        args.append(self.zone)
+        # Delete instance and set status to 'OFF' once it's gone
+        try:
+            self.compute.delete_instance(self.name, wait=wait)
+        except BaseException, e:
+            fail_time = time.time()
 
-        # Provide input to the command
-        args[0:0] = ["yes", "2>/dev/null", "|"]
+            # Delete may have gone through even though the request failed
+            # Ask an inventory listed after the failure so failed destroys share a single list call
+            if not self.instance_exists(since=fail_time):
+                logging.warning("(%s) Process 'destroy' received an error but instance no longer exists!" % self.name)
 
-        # Run command, wait for destroy to complete, and set status to 'OFF'
-        self.processes["destroy"] = Process(" ".join(args), stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+            else:
+                logging.error("(%s) Process 'destroy' failed!" % self.name)
+                if e.message != "":
+                    logging.error("(%s) The following error was received: %s" % (self.name, e.message))
+                raise RuntimeError("Instance %s has failed!" % self.name)
 
-        # Wait for delete to complete if requested
-        if wait:
-            self.wait_process("destroy")
+        self.set_status(GoogleProcessor.OFF)
+        logging.info("(%s) Process 'destroy' complete!" % self.name)
 
     def wait_process(self, proc_name):
+        # Return immediately if process has already been waited on and moved to the process history
+        if proc_name not in self.processes:
+            return
+
         # Get process from process list
         proc_obj = self.processes[proc_name]
 
@@ -162,67 +185,60 @@ class GoogleProcessor(Processor):
         if proc_obj.is_complete():
             return
 
-        # Wait for process to finish
-        # Communicate used to prevent stdout and stderr buffers from filling and deadlocking
-        out, err = proc_obj.communicate()
+        attempt = 0
+        while True:
+            # Wait for process to finish
+            # Output is drained by the process manager so stdout and stderr buffers can't fill and deadlock
+            out, err = proc_obj.get_output()
 
-        # Set process to complete
-        proc_obj.set_complete()
+            # Set process to complete
+            proc_obj.set_complete()
 
-        # Case: Process completed with errors
-        if proc_obj.has_failed():
-            # Check to see whether error is fatal
-            if self.is_fatal_error(proc_name, err):
-
-                # Retry process if retries are left
-                if proc_obj.get_num_retries() > 0:
-                    # Sleep for ten seconds before retrying
-                    logging.warning("(%s) Process '%s' failed but we still got %s retries left. Re-running command!" % (
-                    self.name, proc_name, proc_obj.get_num_retries()))
-                    time.sleep(10)
-                    if proc_name in ["create", "destroy"]:
-                        # Retry create/destroy commands
-                        self.processes[proc_name] = Process(proc_obj.get_command(),
-                                                            cmd=proc_obj.get_command(),
-                                                            stdout=sp.PIPE,
-                                                            stderr=sp.PIPE,
-                                                            shell=True,
-                                                            num_retries=proc_obj.get_num_retries() - 1)
-                    else:
-                        # Retry any other types of commands
-                        self.run(job_name=proc_name,
-                                 cmd=proc_obj.get_command(),
-                                 num_retries=proc_obj.get_num_retries() - 1)
-
-                    return self.wait_process(proc_name)
+            # Case: Process completed
+            if not proc_obj.has_failed():
+                break
 
+            # Case: Process completed with errors
+            # Check to see whether error is fatal
+            if not self.is_fatal_error(proc_name, err):
+                break
+
+            # Retry process after a backoff delay if retries are left
+            policy = RetryPolicy.for_error(err, proc_obj.returncode)
+            logging.warning("(%s) Process '%s' failed with exit code %s! %d retries left." % (
+                self.name, proc_name, proc_obj.returncode, proc_obj.get_num_retries()))
+            if not policy.retry(attempt, proc_obj.get_num_retries()):
                 # Just throw an error otherwise
                 logging.error("(%s) Process '%s' failed!" % (self.name, proc_name))
                 logging.error("(%s) The following error was received: \n  %s\n%s" % (self.name, out, err))
+                self.finish_process(proc_name)
                 raise RuntimeError("Instance %s has failed!" % self.name)
 
-        # Set status to 'OFF' if destroy is True
-        if proc_name == "destroy":
-            self.set_status(GoogleProcessor.OFF)
+            # Reconnect before retrying if the command couldn't reach the instance
+            if proc_obj.returncode == 255:
+                self.transport.reset()
+
+            # Retry command
+            logging.warning("(%s) Re-running process '%s'!" % (self.name, proc_name))
+            self.run(job_name=proc_name,
+                     cmd=proc_obj.get_command(),
+                     num_retries=proc_obj.get_num_retries() - 1,
+                     stdin_data=proc_obj.get_stdin_data(),
+                     output_limit=proc_obj.get_output_limit())
+            proc_obj = self.processes[proc_name]
+            attempt += 1
 
-        # Case: Process completed
         logging.info("(%s) Process '%s' complete!" % (self.name, proc_name))
+        self.finish_process(proc_name)
         return out, err
 
     def adapt_cmd(self, cmd):
-        # Adapt command for running on instance through gcloud ssh
-        cmd = cmd.replace("'", "'\"'\"'")
-        cmd = "gcloud compute ssh gap@%s --command '%s' --zone %s" % (self.name, cmd, self.zone)
-        return cmd
+        # Adapt command for running on instance through ssh
+        return self.transport.wrap_cmd(cmd)
 
     def is_fatal_error(self, proc_name, err_msg):
         # Check to see if program should exit due to error received
-        if proc_name == "destroy":
-            # Check if 'destroy' process actually deleted the instance, in which case program can continue running
-            cmd = 'gcloud compute instances list | grep "%s"' % self.name
-            out, _ = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True, preexec_fn=os.setsid).communicate()
-            if len(out) == 0:
-                return False
+        # Instance creation and deletion errors are handled by the compute client
         return True
 
     def wait_until_ready(self):
@@ -230,38 +246,23 @@ class GoogleProcessor(Processor):
         # This signifies that the instance has initialized ssh and the instance environment is finalized
 
         logging.info("(%s) Waiting for instance startup-script completion..." % self.name)
-        ready = False
-        cycle_count = 1
 
         # Waiting 20 minutes for the instance to finish running
-        while cycle_count < 600 and not ready:
-            # Check the syslog to see if it contains text indicating the startup has completed
-            cmd         = 'gcloud compute instances describe %s --format json --zone %s' % (self.name, self.zone)
-            proc        = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True, preexec_fn = os.setsid)
-            out, err    = proc.communicate()
-
-            # Raise error if unable to get syslog from instance
-            if len(err) > 0:
-                logging.error("(%s) Unable to poll startup! Received the following error:\n%s" % (self.name, err))
-                raise RuntimeError("Instance %s has failed!" % self.name)
+        # Fleet poller checks instance metadata for "READY" along with every other booting instance
+        state = self.poller.wait_until_ready(self.name, timeout=1200, is_cancelled=lambda: self.locked)
 
-            # Check to see if "READY" has been added to instance metadata indicating startup-script has complete
-            data = json.loads(out)
-            for item in data["metadata"]["items"]:
-                if item["key"] == "READY":
-                    ready = True
+        # Stop waiting for creation if locked
+        if state == FleetPoller.CANCELLED:
+            logging.error("(%s) Instance stopped before create could finish!" % self.name)
+            raise RuntimeError("Instance %s stopped before created" % self.name)
 
-            # Stop waiting for creation if locked
-            if self.locked:
-                logging.error("(%s) Instance stopped before create could finish!" % self.name)
-                raise RuntimeError("Instance %s stopped before created" % self.name)
-
-            # Sleep for a couple secs and try all over again if nothing was found
-            time.sleep(2)
-            cycle_count += 1
+        # Raise error if instance disappeared while booting
+        elif state == FleetPoller.MISSING:
+            logging.error("(%s) Unable to poll startup! Instance no longer exists." % self.name)
+            raise RuntimeError("Instance %s has failed!" % self.name)
 
         # Raise error if instance not initialized within the alloted timeframe
-        if not ready:
+        elif state == FleetPoller.TIMEOUT:
             logging.error("(%s) Instance failed! 'Create' Process took more than 20 minutes!" % self.name)
             raise RuntimeError("Instance %s has failed!" % self.name)
 
@@ -275,19 +276,6 @@ class GoogleProcessor(Processor):
             logging.error("(%s) Cannot provision an instance with %d GB RAM. Maximum is %d GB RAM." % (self.name, self.mem, self.MAX_MEM))
             raise RuntimeError("Instance %s has failed!" % self.name)
 
-        # Obtaining prices from Google Cloud Platform
-        try:
-            price_json_url = "https://cloudpricingcalculator.appspot.com/static/data/pricelist.json"
-
-            # Disabling low levels of logging from module requests
-            logging.getLogger("requests").setLevel(logging.WARNING)
-
-            prices = requests.get(price_json_url).json()["gcp_price_list"]
-        except BaseException as e:
-            if e.message != "":
-                logging.error("Could not obtain instance prices. The following error appeared: %s." % e.message)
-            raise
-
         # Defining instance types to mem/cpu ratios
         ratio = dict()
         ratio["highcpu"] = 1.80 / 2
@@ -319,7 +307,7 @@ class GoogleProcessor(Processor):
         predef_inst["type_name"] = "n1-%s-%d" % (instance_type, predef_inst["nr_cpus"])
 
         # Obtaining the price of the predefined instance
-        predef_inst["price"] = prices["CP-COMPUTEENGINE-VMIMAGE-%s" % predef_inst["type_name"].upper()]["us"]
+        predef_inst["price"] = self.price_catalog.get_price("CP-COMPUTEENGINE-VMIMAGE-%s" % predef_inst["type_name"].upper())
 
         # Initializing custom instance data
         custom_inst = {}
@@ -345,8 +333,8 @@ class GoogleProcessor(Processor):
         custom_inst["type_name"] = "custom-%d-%d" % (custom_inst["nr_cpus"], custom_inst["mem"])
 
         # Computing the price of a custom instance
-        custom_price_cpu = prices["CP-COMPUTEENGINE-CUSTOM-VM-CORE"]["us"]
-        custom_price_mem = prices["CP-COMPUTEENGINE-CUSTOM-VM-RAM"]["us"]
+        custom_price_cpu = self.price_catalog.get_price("CP-COMPUTEENGINE-CUSTOM-VM-CORE")
+        custom_price_mem = self.price_catalog.get_price("CP-COMPUTEENGINE-CUSTOM-VM-RAM")
         custom_inst["price"] = custom_price_cpu * custom_inst["nr_cpus"] + custom_price_mem * custom_inst["mem"]
 
         if predef_inst["price"] <= custom_inst["price"]:
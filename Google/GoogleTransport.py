@@ -0,0 +1,174 @@
+import logging
+import os
+import pipes
+import shlex
+import subprocess as sp
+import tempfile
+import threading
+
+class GcloudTransport(object):
+    # Runs every command through its own 'gcloud compute ssh' session
+
+    def __init__(self, instance_name, zone, user="gap", **kwargs):
+        self.instance_name  = instance_name
+        self.zone           = zone
+        self.user           = user
+
+    def wrap_cmd(self, cmd):
+        # Return local command that runs cmd on the instance
+        return "gcloud compute ssh %s@%s --command %s --zone %s" % (self.user, self.instance_name, self.quote(cmd), self.zone)
+
+    def upload_cmd(self, src_path, dest_path):
+        # Return local command that copies a local file to the instance
+        return "gcloud compute scp %s %s@%s:%s --zone %s" % (src_path, self.user, self.instance_name, dest_path, self.zone)
+
+    def reset(self):
+        # Forget any connection state after a failed command
+        pass
+
+    def close(self):
+        # Release any connection held open to the instance
+        pass
+
+    @staticmethod
+    def quote(cmd):
+        # Quote command so it's passed to the remote shell as is
+        return "'%s'" % cmd.replace("'", "'\"'\"'")
+
+
+class MultiplexedSSHTransport(GcloudTransport):
+    # Keeps one persistent SSH master connection per instance and runs every command over it
+    # Connection settings are resolved once with gcloud so each command skips gcloud startup and the SSH handshake
+
+    def __init__(self, instance_name, zone, user="gap", control_persist=600, control_dir=None, **kwargs):
+        super(MultiplexedSSHTransport, self).__init__(instance_name, zone, user)
+
+        # Seconds the master connection stays open after its last use
+        self.control_persist = control_persist
+
+        # Directory holding master connection sockets
+        self.control_dir    = os.path.join(tempfile.gettempdir(), "cc-daemon-ssh") if control_dir is None else control_dir
+        self.control_path   = os.path.join(self.control_dir, instance_name)
+
+        # SSH identity/host options and destination (user@ip) resolved from gcloud
+        self.ssh_options    = None
+        self.destination    = None
+
+        self.connection_lock = threading.Lock()
+
+    def wrap_cmd(self, cmd):
+        try:
+            ssh_args = self.__connect()
+        except BaseException, e:
+            # Fall back to a one-off gcloud session so the command can still run
+            logging.warning("(%s) Unable to open multiplexed SSH connection! Falling back to gcloud ssh." % self.instance_name)
+            if e.message != "":
+                logging.warning("Received the following error: %s" % e.message)
+            return super(MultiplexedSSHTransport, self).wrap_cmd(cmd)
+
+        return "ssh %s %s" % (" ".join([pipes.quote(arg) for arg in ssh_args]), self.quote(cmd))
+
+    def upload_cmd(self, src_path, dest_path):
+        try:
+            ssh_args = self.__connect()
+        except BaseException, e:
+            logging.warning("(%s) Unable to open multiplexed SSH connection! Falling back to gcloud scp." % self.instance_name)
+            if e.message != "":
+                logging.warning("Received the following error: %s" % e.message)
+            return super(MultiplexedSSHTransport, self).upload_cmd(src_path, dest_path)
+
+        # scp takes the same options as ssh except for the port flag
+        scp_args    = ["-P" if arg == "-p" else arg for arg in ssh_args[:-1]]
+        dest        = "%s:%s" % (ssh_args[-1], dest_path)
+        return "scp %s %s %s" % (" ".join([pipes.quote(arg) for arg in scp_args]), pipes.quote(src_path), pipes.quote(dest))
+
+    def reset(self):
+        # Close master connection and resolve connection settings again on next command
+        # Instance may have been restarted with a new IP address
+        with self.connection_lock:
+            self.__exit_master()
+            self.ssh_options    = None
+            self.destination    = None
+
+    def close(self):
+        with self.connection_lock:
+            self.__exit_master()
+
+    def __connect(self):
+        # Return ssh arguments that run a command over the master connection, opening it if necessary
+        with self.connection_lock:
+            if self.ssh_options is None:
+                self.__resolve()
+
+            ssh_args = self.ssh_options + ["-o", "ControlPath=%s" % self.control_path]
+
+            # Start master connection if it isn't running
+            # Pipes of processes started by other threads aren't inherited so their readers aren't kept waiting on EOF
+            with open(os.devnull, "w") as devnull:
+                if sp.call(["ssh"] + ssh_args + ["-O", "check", self.destination],
+                           stdout=devnull, stderr=devnull, close_fds=True) != 0:
+                    logging.debug("(%s) Opening multiplexed SSH connection..." % self.instance_name)
+                    if not os.path.exists(self.control_dir):
+                        os.makedirs(self.control_dir)
+
+                    # Master forks into background with no open pipes so callers reading output don't wait on it
+                    master_args = ["-o", "ControlMaster=yes", "-o", "ControlPersist=%d" % self.control_persist, "-f", "-N"]
+                    if sp.call(["ssh"] + ssh_args + master_args + [self.destination],
+                               stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True) != 0:
+                        raise RuntimeError("Unable to open SSH master connection to %s!" % self.instance_name)
+
+            # Commands never become masters themselves
+            return ssh_args + ["-o", "ControlMaster=no", self.destination]
+
+    def __resolve(self):
+        # Get the ssh command gcloud would run for this instance
+        base_cmd = "gcloud compute ssh %s@%s --zone %s" % (self.user, self.instance_name, self.zone)
+
+        # Run one command through gcloud first so it propagates ssh keys to the instance
+        self.__gcloud("%s --command true" % base_cmd)
+        out, err = self.__gcloud("%s --dry-run" % base_cmd)
+
+        ssh_cmd = shlex.split(out.strip().splitlines()[-1])
+
+        # Keep port, identity and host options. Drop tty allocation.
+        self.ssh_options = []
+        i = 1
+        while i < len(ssh_cmd) - 1:
+            if ssh_cmd[i] in ["-i", "-o", "-p"]:
+                self.ssh_options.extend(ssh_cmd[i:i+2])
+                i += 2
+            else:
+                i += 1
+        self.ssh_options.extend(["-o", "BatchMode=yes"])
+        self.destination = ssh_cmd[-1]
+
+    def __exit_master(self):
+        if self.destination is None:
+            return
+        with open(os.devnull, "w") as devnull:
+            sp.call(["ssh", "-o", "ControlPath=%s" % self.control_path, "-O", "exit", self.destination],
+                    stdout=devnull, stderr=devnull, close_fds=True)
+
+    def __gcloud(self, cmd):
+        proc        = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True, close_fds=True)
+        out, err    = proc.communicate()
+        if proc.returncode != 0:
+            logging.debug("(%s) Command '%s' failed with the following error:\n%s" % (self.instance_name, cmd, err))
+            raise RuntimeError("Unable to resolve SSH settings for %s!" % self.instance_name)
+        return out, err
+
+
+class LocalTransport(GcloudTransport):
+    # Test double that runs commands and uploads on the local machine instead of the instance
+
+    def wrap_cmd(self, cmd):
+        return "bash -c %s" % self.quote(cmd)
+
+    def upload_cmd(self, src_path, dest_path):
+        return "cp %s %s" % (src_path, dest_path)
+
+
+# Transports selectable from the platform config
+TRANSPORTS = {"gcloud":         GcloudTransport,
+              "multiplexed":    MultiplexedSSHTransport,
+              "local":          LocalTransport}
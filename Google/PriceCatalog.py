@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+class PriceCatalog(object):
+    # Compute Engine prices used to choose instance types
+    # Shared by every processor, kept in memory, persisted to disk and refreshed in the background once stale
+
+    # Public price list of Google Cloud pricing calculator
+    PRICE_LIST_URL = "https://cloudpricingcalculator.appspot.com/static/data/pricelist.json"
+
+    # Only Compute Engine instance prices are kept from the full price list
+    PRICE_PREFIXES = ["CP-COMPUTEENGINE-VMIMAGE-", "CP-COMPUTEENGINE-CUSTOM-VM-"]
+
+    # Catalogs shared by every processor using the same cache file
+    shared_catalogs = {}
+    shared_lock     = threading.Lock()
+
+    def __init__(self, cache_file=None, ttl=86400, region="us", url=None):
+
+        # Compact copy of prices on disk used on startup and when price list can't be downloaded
+        self.cache_file = os.path.join(tempfile.gettempdir(), "cc-daemon-prices.json") if cache_file is None else cache_file
+
+        # Seconds after which prices are refreshed
+        self.ttl        = ttl
+
+        # Pricing region of prices that are kept
+        self.region     = region
+        self.url        = self.PRICE_LIST_URL if url is None else url
+
+        # Price of each instance type (price key -> hourly price) and time they were downloaded
+        self.prices         = None
+        self.fetch_time     = 0
+        self.catalog_lock   = threading.Lock()
+
+        # Only one download runs when prices are needed but not available
+        self.download_lock  = threading.Lock()
+
+        # Background refresh thread
+        self.refresh_thread = None
+
+        # Load prices saved by a previous run
+        self.__load()
+
+    @staticmethod
+    def get_shared(cache_file=None, ttl=86400):
+        # Return price catalog shared by every processor using the same cache file
+        with PriceCatalog.shared_lock:
+            if cache_file not in PriceCatalog.shared_catalogs:
+                PriceCatalog.shared_catalogs[cache_file] = PriceCatalog(cache_file=cache_file, ttl=ttl)
+            return PriceCatalog.shared_catalogs[cache_file]
+
+    def get_price(self, price_key):
+        # Return hourly price of an instance type or custom CPU/RAM unit
+        with self.catalog_lock:
+            prices      = self.prices
+            is_stale    = time.time() - self.fetch_time > self.ttl
+
+        if prices is None:
+            # Nothing in memory or on disk so prices have to be downloaded now
+            with self.download_lock:
+                if self.prices is None:
+                    self.refresh()
+            with self.catalog_lock:
+                prices = self.prices
+
+        elif is_stale:
+            # Keep using current prices while newer prices are downloaded
+            self.__refresh_in_background()
+
+        if price_key not in prices:
+            logging.error("(PriceCatalog) No price available for '%s'!" % price_key)
+            raise KeyError("No price available for '%s'!" % price_key)
+
+        return prices[price_key]
+
+    def refresh(self):
+        # Download price list and keep only the prices needed to choose instance types
+        try:
+            price_list = requests.get(self.url, timeout=60).json()["gcp_price_list"]
+        except BaseException, e:
+            logging.error("(PriceCatalog) Could not obtain instance prices!")
+            if e.message != "":
+                logging.error("The following error appeared: %s." % e.message)
+
+            # Prices on disk are used, however old they are, if they exist
+            with self.catalog_lock:
+                if self.prices is not None:
+                    logging.warning("(PriceCatalog) Using prices downloaded at %s!" % time.ctime(self.fetch_time))
+                    return
+            raise
+
+        prices = dict()
+        for price_key, price in price_list.iteritems():
+            if any([price_key.startswith(prefix) for prefix in self.PRICE_PREFIXES]) and self.region in price:
+                prices[price_key] = price[self.region]
+
+        with self.catalog_lock:
+            self.prices     = prices
+            self.fetch_time = time.time()
+
+        self.__save()
+        logging.debug("(PriceCatalog) Refreshed %d instance prices!" % len(prices))
+
+    def __refresh_in_background(self):
+        with self.catalog_lock:
+            if self.refresh_thread is not None and self.refresh_thread.is_alive():
+                return
+            self.refresh_thread = threading.Thread(target=self.__refresh_quietly)
+            self.refresh_thread.daemon = True
+            self.refresh_thread.start()
+
+    def __refresh_quietly(self):
+        # Background refreshes fall back to current prices on failure
+        try:
+            self.refresh()
+        except BaseException:
+            pass
+
+    def __load(self):
+        # Load prices saved to disk
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r") as fh:
+                cache = json.load(fh)
+            if cache["region"] == self.region:
+                self.prices     = cache["prices"]
+                self.fetch_time = cache["fetch_time"]
+        except BaseException, e:
+            logging.warning("(PriceCatalog) Unable to read price cache file: %s" % self.cache_file)
+            if e.message != "":
+                logging.warning("Received the following error: %s" % e.message)
+
+    def __save(self):
+        # Write prices to disk through a temp file so a partially written file is never read
+        with self.catalog_lock:
+            cache = {"region": self.region, "fetch_time": self.fetch_time, "prices": self.prices}
+        try:
+            tmp_file = "%s.%d.%d.tmp" % (self.cache_file, os.getpid(), threading.current_thread().ident)
+            with open(tmp_file, "w") as fh:
+                json.dump(cache, fh, separators=(",", ":"))
+            os.rename(tmp_file, self.cache_file)
+        except BaseException, e:
+            logging.warning("(PriceCatalog) Unable to write price cache file: %s" % self.cache_file)
+            if e.message != "":
+                logging.warning("Received the following error: %s" % e.message)
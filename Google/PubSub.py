@@ -4,23 +4,33 @@ import json
 import subprocess as sp
 import zlib
 
+from CCDaemon.Platform import RetryPolicy
+
 class PubSub(object):
 
     @staticmethod
-    def _run_cmd(cmd, err_msg=None):
-
-        # Running and waiting for the command
-        proc = sp.Popen(cmd, shell=True, stdout=sp.PIPE, stderr=sp.PIPE)
-        out, err = proc.communicate()
-
-        # Check if any error has appeared
-        if len(err) != 0 and "error" in err.lower():
-            logging.error("Google Pub/Sub stopped working!")
-            if err_msg is not None:
-                logging.error("%s. The following error appeared:\n    %s" % (err_msg, err))
-            raise RuntimeError("Google Pub/Sub stopped working!")
-
-        return out
+    def _run_cmd(cmd, err_msg=None, num_retries=2):
+
+        attempt = 0
+        while True:
+            # Running and waiting for the command
+            proc = sp.Popen(cmd, shell=True, stdout=sp.PIPE, stderr=sp.PIPE)
+            out, err = proc.communicate()
+
+            # Check if any error has appeared
+            if len(err) == 0 or "error" not in err.lower():
+                return out
+
+            # Retry after a backoff delay in case Pub/Sub is throttling requests or briefly unavailable
+            policy = RetryPolicy.for_error(err, default=RetryPolicy.TRANSIENT)
+            if not policy.retry(attempt, num_retries - attempt):
+                break
+            attempt += 1
+
+        logging.error("Google Pub/Sub stopped working!")
+        if err_msg is not None:
+            logging.error("%s. The following error appeared:\n    %s" % (err_msg, err))
+        raise RuntimeError("Google Pub/Sub stopped working!")
 
     @staticmethod
     def get_message(subscription):
@@ -1,3 +1,8 @@
+from GoogleTransport import GcloudTransport, MultiplexedSSHTransport, LocalTransport
+from ComputeClient import ComputeClient, GcloudComputeClient, HttpComputeClient
+from PriceCatalog import PriceCatalog
+from FleetPoller import FleetPoller
+from FleetInventory import FleetInventory
 from GoogleProcessor import GoogleProcessor
 from GooglePlatform import GooglePlatform
 from PubSub import PubSub